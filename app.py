@@ -1,98 +1,641 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from datetime import datetime, timedelta
-import threading
 import time
+# Taken before any other import so the "import app" startup phase covers them
+_import_started = time.perf_counter()
+from datetime import date, datetime, timedelta
+import threading
+import asyncio
+import concurrent.futures
 import json
+import heapq
+import bisect
 from dotenv import load_dotenv
 load_dotenv()
 import os
 import sys
+import logging
+import signal
+import socket
+import argparse
 import smtplib
-from pymongo import MongoClient
-from bson.objectid import ObjectId
+import sqlite3
+import uuid
+import queue
+import itertools
+import zlib
+import csv
+import contextlib
+import functools
+import importlib
+import importlib.util
+from collections import deque, OrderedDict
+from types import SimpleNamespace
+from xml.sax.saxutils import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from email.mime.text import MIMEText
 
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox, simpledialog
+except ImportError:
+    # Headless servers may not ship Tk; only the GUI needs it
+    tk = None
+
+log = logging.getLogger("medicine_reminder")
+
+class StartupTimer:
+    """Durations of the startup phases (``phase``/``mark``), reported once the app is ready"""
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def mark(self, name):
+        self.phases[name] = round((time.perf_counter() - self.started) * 1000, 1)
+
+    def report(self):
+        phases = dict(self.phases)
+        log.info("Startup timing (ms): %s", ", ".join(f"{name} {ms}" for name, ms in phases.items()),
+                 extra={"phases_ms": phases})
+        return phases
+
+startup = StartupTimer(_import_started)
+
+def optional_module(name):
+    """True if ``name`` is installed, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+def lazy_import(name):
+    """Import ``name`` the first time a feature needs it, timing the import"""
+    module = sys.modules.get(name)
+    if module is None:
+        with startup.phase(f"import {name}"):
+            module = importlib.import_module(name)
+    return module
+
 # Configuration
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+DB_CONFIG = {
+    # mongo, sqlite or memory
+    "backend": os.getenv("DB_BACKEND", "mongo"),
+    "sqlite_path": os.getenv("SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reminders.db')),
+    "url": os.getenv("MONGO_URL", 'mongodb://localhost:27017/'),
+    "db_name": os.getenv("MONGO_DB", 'reminder_db'),
+    # Change streams need a replica set; leave off for a standalone mongod
+    "watch_changes": os.getenv("DB_WATCH_CHANGES", "0") == "1",
+    # Raw dose events older than this are dropped (0 keeps them forever); daily totals are kept
+    "event_retention_days": int(os.getenv("DOSE_EVENT_RETENTION_DAYS", "90"))
+}
+
+SCHEDULER_CONFIG = {
+    # Patients are split across this many scheduler threads
+    "partitions": int(os.getenv("SCHEDULER_PARTITIONS", "1")),
+    # At startup, recurring occurrences older than this many minutes are
+    # recorded as missed and skipped; newer ones still fire
+    "catch_up_grace": int(os.getenv("CATCH_UP_GRACE_MINUTES", "60")),
+    # A claimed reminder is locked to its scheduler instance this long; if the
+    # instance dies before marking it notified, another one takes it over
+    "lease_seconds": int(os.getenv("CLAIM_LEASE_SECONDS", "300")),
+    # Without a change stream, reminders written by other processes are only
+    # picked up by a claim sweep run this often
+    "sweep_seconds": int(os.getenv("CLAIM_SWEEP_SECONDS", "30"))
+}
+
+# Reminders are stamped with a stable shard (0..SHARD_COUNT-1) derived from
+# their patient; a scheduler partition owns every shard where shard % partitions == index
+SHARD_COUNT = 1024
+
+def shard_of(patient_id):
+    return zlib.crc32((patient_id or '').encode()) % SHARD_COUNT
+
 EMAIL_ENABLED = True
 EMAIL_CONFIG = {
     "smtp_server": "smtp.gmail.com",
     "smtp_port": 587,
     "email_address": os.getenv("EMAIL_ADDRESS"),
     "email_password": os.getenv("EMAIL_PASSWORD"),
-    "recipient_email": os.getenv("RECIPIENT_EMAIL")
+    "recipient_email": os.getenv("RECIPIENT_EMAIL"),
+    # Close a pooled connection that has been idle this long (seconds)
+    "idle_timeout": 120,
+    # One email for all reminders that fire in the same scheduler tick
+    "digest": os.getenv("EMAIL_DIGEST", "1") == "1"
 }
 
+NOTIFY_CONFIG = {
+    "workers": 4,
+    # Maximum concurrent jobs per channel
+    "channel_limits": {"sound": 1, "tray": 1, "email": 2},
+    # Reminders fired by any partition within this window are alerted together
+    "coalesce_ms": int(os.getenv("NOTIFY_COALESCE_MS", "250"))
+}
+
+METRICS_CONFIG = {
+    # Serve GET /metrics as JSON on 127.0.0.1:<port>; 0 disables the endpoint
+    "port": int(os.getenv("METRICS_PORT", "0")),
+    # Also write the same JSON snapshot to this file every interval seconds
+    "snapshot_path": os.getenv("METRICS_FILE", ""),
+    "snapshot_interval": int(os.getenv("METRICS_INTERVAL", "60"))
+}
+
+class Histogram:
+    """Cumulative bucket counts plus count/sum/max for one latency series, in seconds"""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        # Cumulative, Prometheus-style: each le_<bound> counts every observation <= bound
+        running = itertools.accumulate(self.counts)
+        buckets = {f"le_{bound:g}": n for bound, n in zip(self.BUCKETS, running)}
+        buckets["le_+Inf"] = self.count
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "max": None if self.max is None else round(self.max, 6), "buckets": buckets}
+
+class Metrics:
+    """Process-wide counters and histograms, keyed by name and labels"""
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "ts": datetime.now().isoformat(timespec='seconds'),
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self._counters.items())],
+                "histograms": [dict(name=name, labels=dict(labels), **histogram.to_dict())
+                               for (name, labels), histogram in sorted(self._histograms.items())]
+            }
+
+metrics = Metrics()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.metrics.snapshot()).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug("metrics request: " + format, *args)
+
+class MetricsExporter:
+    """Exposes ``metrics`` on a local HTTP endpoint and/or a periodically rewritten JSON file"""
+    def __init__(self, metrics, port=0, snapshot_path='', snapshot_interval=60):
+        self.metrics = metrics
+        self.port = port
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._server = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.port:
+            self._server = ThreadingHTTPServer(('127.0.0.1', self.port), _MetricsHandler)
+            self._server.daemon_threads = True
+            self._server.metrics = self.metrics
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            log.info("Metrics endpoint listening", extra={"url": f"http://127.0.0.1:{self.port}/metrics"})
+        if self.snapshot_path:
+            threading.Thread(target=self._write_loop, daemon=True).start()
+
+    def _write_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        # Write then rename so readers never see a half-written file
+        tmp = self.snapshot_path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.metrics.snapshot(), f)
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            log.error("Could not write metrics snapshot: %s", e)
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.snapshot_path:
+            self.write_snapshot()
+
 TWILIO_ENABLED = True
 TWILIO_CONFIG = {
     "account_sid": os.getenv("TWILIO_ACCOUNT_SID"),
     "auth_token": os.getenv("TWILIO_AUTH_TOKEN"),
     "from_number": os.getenv("TWILIO_FROM_NUMBER"),
-    "to_number": os.getenv("TWILIO_TO_NUMBER")
+    "to_number": os.getenv("TWILIO_TO_NUMBER"),
+    "calls_per_minute": int(os.getenv("TWILIO_CALLS_PER_MINUTE", "10")),
+    "max_retries": 3,
+    # Seconds before the first retry; doubled on every further attempt
+    "backoff": 2.0,
+    # Use FakeTwilioClient instead of dialing out
+    "fake": os.getenv("TWILIO_FAKE", "0") == "1"
 }
 
-try:
-    from twilio.rest import Client
-except ImportError:
-    TWILIO_ENABLED = False
+# Channel and database libraries are only imported when first used
+if not optional_module("twilio"):
+    TWILIO_ENABLED = TWILIO_CONFIG["fake"]
+
+MONGO_AVAILABLE = optional_module("pymongo")
+
+@functools.lru_cache(maxsize=None)
+def _mongo():
+    """pymongo and bson names, imported when the first Mongo backend opens"""
+    pymongo = lazy_import("pymongo")
+    errors = lazy_import("pymongo.errors")
+    return SimpleNamespace(
+        MongoClient=pymongo.MongoClient, ASCENDING=pymongo.ASCENDING, UpdateOne=pymongo.UpdateOne,
+        ReturnDocument=pymongo.ReturnDocument, PyMongoError=errors.PyMongoError,
+        BulkWriteError=errors.BulkWriteError, DuplicateKeyError=errors.DuplicateKeyError,
+        ObjectId=lazy_import("bson.objectid").ObjectId
+    )
+
+class FakeTwilioClient:
+    """Offline stand-in for twilio.rest.Client that records calls instead of dialing"""
+    def __init__(self, account_sid=None, auth_token=None, latency=0.0):
+        self.latency = latency
+        self.placed = []
+        self.calls = self
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, to, from_, twiml):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            sid = f"CAFAKE{next(self._ids):08d}"
+            self.placed.append({'sid': sid, 'to': to, 'from': from_, 'twiml': twiml})
+        return SimpleNamespace(sid=sid)
+
+_twilio_client = None
+_twilio_client_lock = threading.Lock()
+
+def get_twilio_client():
+    """Return the shared Twilio client, whose HTTP session is reused between calls"""
+    global _twilio_client
+    with _twilio_client_lock:
+        if _twilio_client is None:
+            client_class = FakeTwilioClient if TWILIO_CONFIG["fake"] else lazy_import("twilio.rest").Client
+            _twilio_client = client_class(TWILIO_CONFIG["account_sid"], TWILIO_CONFIG["auth_token"])
+        return _twilio_client
+
+def is_transient_error(error):
+    # TwilioRestException carries the HTTP status; network errors from requests are OSErrors
+    status = getattr(error, 'status', None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(error, OSError)
+
+def build_call_twiml(items):
+    if len(items) == 1:
+        text = f"Reminder! It's time to take your medicine {items[0]}."
+    else:
+        text = f"Reminder! It's time to take your medicines: {'; '.join(items)}."
+    return f'<Response><Say>{escape(text)}</Say></Response>'
+
+class CallQueue:
+    """Outbound call queue: merges messages per number, caps calls per minute and retries transient errors"""
+    def __init__(self, client_factory, from_number, calls_per_minute=10, max_retries=3, backoff=2.0, post=None):
+        self.client_factory = client_factory
+        self.from_number = from_number
+        self.calls_per_minute = calls_per_minute
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.post = post or (lambda fn: fn())
+        self.running = True
+        self._pending = OrderedDict()
+        self._attempts = deque()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, to_number, items, callback=None):
+        with self._cond:
+            entry = self._pending.setdefault(to_number, ([], []))
+            entry[0].extend(items)
+            if callback:
+                entry[1].append(callback)
+            self._cond.notify()
+
+    def _wait_for_slot(self):
+        # Caller holds self._cond
+        while self.running:
+            now = time.monotonic()
+            while self._attempts and now - self._attempts[0] >= 60:
+                self._attempts.popleft()
+            if len(self._attempts) < self.calls_per_minute:
+                self._attempts.append(now)
+                return True
+            self._cond.wait(60 - (now - self._attempts[0]))
+        return False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.running and not self._pending:
+                    self._cond.wait()
+                if not self._wait_for_slot():
+                    return
+                to_number, (items, callbacks) = self._pending.popitem(last=False)
+            with metrics.timer("channel_seconds", channel="call"):
+                sid = self._place(to_number, items)
+            if sid is None:
+                metrics.inc("channel_failures", channel="call")
+            for callback in callbacks:
+                self.post(lambda callback=callback: callback(sid is not None))
+
+    def _place(self, to_number, items):
+        twiml = build_call_twiml(items)
+        for attempt in range(self.max_retries + 1):
+            try:
+                call = self.client_factory().calls.create(to=to_number, from_=self.from_number, twiml=twiml)
+                log.info("Twilio call initiated", extra={"sid": call.sid, "to": to_number})
+                return call.sid
+            except Exception as e:
+                if not is_transient_error(e) or attempt == self.max_retries:
+                    log.error("Failed to make Twilio call: %s", e)
+                    return None
+                delay = self.backoff * (2 ** attempt)
+                metrics.inc("call_retries")
+                log.warning("Twilio call failed (%s), retrying in %gs", e, delay)
+                time.sleep(delay)
+                with self._cond:
+                    if not self._wait_for_slot():
+                        return None
+        return None
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
 
-def make_call(message):
+_call_queue = None
+_call_queue_lock = threading.Lock()
+
+def get_call_queue():
+    """Return the shared call queue, starting its thread on the first call"""
+    global _call_queue
+    with _call_queue_lock:
+        if _call_queue is None:
+            _call_queue = CallQueue(get_twilio_client, TWILIO_CONFIG["from_number"],
+                                    calls_per_minute=TWILIO_CONFIG["calls_per_minute"],
+                                    max_retries=TWILIO_CONFIG["max_retries"],
+                                    backoff=TWILIO_CONFIG["backoff"])
+        return _call_queue
+
+def stop_call_queue():
+    """Stop the shared call queue; the next call starts a fresh one"""
+    global _call_queue
+    with _call_queue_lock:
+        stopping, _call_queue = _call_queue, None
+    if stopping is not None:
+        stopping.stop()
+
+def make_call(items, callback=None, to_number=None):
+    """Queue a call reading out ``items`` (e.g. "Aspirin, dosage 2 tablets")"""
     if not TWILIO_ENABLED:
         return
-    try:
-        client = Client(TWILIO_CONFIG["account_sid"], TWILIO_CONFIG["auth_token"])
-        call = client.calls.create(
-            to=TWILIO_CONFIG["to_number"],
-            from_=TWILIO_CONFIG["from_number"],
-            twiml=f'<Response><Say>{message}</Say></Response>'
-        )
-        print("Twilio call initiated. SID:", call.sid)
-    except Exception as e:
-        print("Failed to make Twilio call:", e)
+    get_call_queue().submit(to_number or TWILIO_CONFIG["to_number"], items, callback)
 
-# Sound and tray notifications
-try:
-    import pygame
-    SOUND_ENABLED = True
-except ImportError:
-    SOUND_ENABLED = False
+# Sound and tray notifications; pygame, pystray and PIL are imported on first use
+SOUND_ENABLED = optional_module("pygame")
+TRAY_ENABLED = optional_module("pystray") and optional_module("PIL")
 
-try:
-    import pystray
-    from PIL import Image, ImageDraw
-    TRAY_ENABLED = True
-except ImportError:
-    TRAY_ENABLED = False
+def _tray_modules():
+    return lazy_import("pystray"), lazy_import("PIL.Image"), lazy_import("PIL.ImageDraw")
+
+
+SOUND_CONFIG = {
+    "alarm": os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alarm.mp3'),
+    # Decoded per-reminder clips kept in memory
+    "cache_size": 8,
+    # Clips allowed to play at the same time; extra alarms are skipped
+    "max_voices": 2
+}
+
+class AudioEngine:
+    """Opens the mixer once and plays clips decoded into memory (an LRU of ``cache_size`` clips)"""
+    def __init__(self, default_path, cache_size=8, max_voices=2):
+        self.default_path = default_path
+        self.cache_size = cache_size
+        self.max_voices = max_voices
+        self._default = None
+        self._clips = OrderedDict()
+        self._lock = threading.Lock()
+        self._mixer = None
+
+    def start(self):
+        with self._lock:
+            if self._default is None:
+                # Keep pygame from printing its banner on import
+                os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+                self._mixer = lazy_import("pygame").mixer
+                self._mixer.init()
+                self._mixer.set_num_channels(self.max_voices)
+                self._default = self._mixer.Sound(self.default_path)
+
+    def _clip(self, path):
+        if not path:
+            return self._default
+        path = os.path.join(os.path.dirname(self.default_path), path)
+        with self._lock:
+            clip = self._clips.get(path)
+            if clip is not None:
+                self._clips.move_to_end(path)
+                return clip
+        clip = self._mixer.Sound(path)
+        with self._lock:
+            self._clips[path] = clip
+            if len(self._clips) > self.cache_size:
+                self._clips.popitem(last=False)
+        return clip
+
+    def play(self, path=None):
+        self.start()
+        channel = self._mixer.find_channel()
+        if channel is None:
+            # Every voice is busy; the alarm is already sounding
+            return False
+        try:
+            clip = self._clip(path)
+        except Exception as e:
+            log.warning("Could not load sound %s, using the default alarm: %s", path, e)
+            clip = self._default
+        channel.play(clip)
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._default is not None:
+                self._mixer.quit()
+                self._default = None
+                self._clips.clear()
 
+audio = AudioEngine(SOUND_CONFIG["alarm"], cache_size=SOUND_CONFIG["cache_size"],
+                    max_voices=SOUND_CONFIG["max_voices"])
 
-def play_sound():
+def play_sound(path=None):
     if SOUND_ENABLED:
         try:
-            sound_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alarm.mp3')
-            pygame.mixer.init()
-            pygame.mixer.music.load(sound_path)
-            pygame.mixer.music.play()
+            return audio.play(path)
         except Exception as e:
-            print("Sound error:", e)
+            log.error("Sound error: %s", e)
+            return False
+
+class SMTPSessionPool:
+    """Keeps authenticated SMTP connections open between messages, replacing idle or dropped ones"""
+    def __init__(self, config, size=2, idle_timeout=120):
+        self.config = config
+        self.idle_timeout = idle_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.config["smtp_server"], self.config["smtp_port"], timeout=30)
+        server.starttls()
+        server.login(self.config["email_address"], self.config["email_password"])
+        return server
+
+    @staticmethod
+    def _quit(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
 
-def send_email(subject, body):
+    def _checkout(self):
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.idle_timeout:
+                return server
+            self._quit(server)
+
+    def send(self, msg):
+        with self._slots:
+            server = self._checkout()
+            try:
+                server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                server = self._resend(server, msg)
+            except smtplib.SMTPException:
+                # Refused recipients or data (SMTPException is an OSError) would only be refused again
+                server.close()
+                raise
+            except OSError:
+                server = self._resend(server, msg)
+            except Exception:
+                server.close()
+                raise
+            self._idle.put((server, time.monotonic()))
+
+    def _resend(self, stale, msg):
+        stale.close()
+        server = self._connect()
+        try:
+            server.send_message(msg)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(server)
+
+smtp_pool = SMTPSessionPool(EMAIL_CONFIG, size=NOTIFY_CONFIG["channel_limits"]["email"],
+                            idle_timeout=EMAIL_CONFIG["idle_timeout"])
+
+def send_email(subject, body, to=None):
     if not EMAIL_ENABLED:
         return
     try:
         msg = MIMEText(body)
         msg['Subject'] = subject
         msg['From'] = EMAIL_CONFIG["email_address"]
-        msg['To'] = EMAIL_CONFIG["recipient_email"]
-        with smtplib.SMTP(EMAIL_CONFIG["smtp_server"], EMAIL_CONFIG["smtp_port"]) as server:
-            server.starttls()
-            server.login(EMAIL_CONFIG["email_address"], EMAIL_CONFIG["email_password"])
-            server.send_message(msg)
-        print("Email sent successfully!")
+        msg['To'] = to or EMAIL_CONFIG["recipient_email"]
+        smtp_pool.send(msg)
+        log.info("Email sent", extra={"subject": subject})
+        return True
     except Exception as e:
-        print("Failed to send email:", e)
+        log.error("Failed to send email: %s", e)
+        return False
+
+def format_digest(reminders):
+    """Build one email subject/body covering every reminder due in the same tick"""
+    lines = [f"- {rem.name} ({rem.dosage}) at {rem.time:%H:%M}" for rem in reminders]
+    subject = f"Medicine Reminder: {len(reminders)} medicines due"
+    body = "Time to take your medicines:\n\n" + "\n".join(lines)
+    return subject, body
 
 def show_tray_notification(title, msg):
     if TRAY_ENABLED and sys.platform.startswith('win'):
+        pystray, Image, ImageDraw = _tray_modules()
+        
         def create_image():
             image = Image.new('RGB', (64, 64), color=(0, 64, 128))
             d = ImageDraw.Draw(image)
@@ -103,51 +646,2202 @@ def show_tray_notification(title, msg):
         icon.visible = True
         icon.notify(msg)
         icon.stop()
+        return True
+
+class EngineLoop:
+    """An asyncio loop on its own thread, with thread pools for blocking database and I/O calls"""
+    def __init__(self, io_workers=4, db_workers=1):
+        self.loop = asyncio.new_event_loop()
+        self.db_executor = concurrent.futures.ThreadPoolExecutor(db_workers, thread_name_prefix='reminder-db')
+        self.io_executor = concurrent.futures.ThreadPoolExecutor(io_workers, thread_name_prefix='reminder-io')
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self.loop.is_closed()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='reminder-loop', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine from any thread; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, fn, *args):
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def call(self, fn, *args, timeout=None):
+        """Run ``fn`` on the loop thread and return its result (directly if the loop is not running)"""
+        if not self.running:
+            return fn(*args)
+
+        async def call():
+            return fn(*args)
+        return self.submit(call()).result(timeout)
+
+    async def run_db(self, fn, *args):
+        return await self.loop.run_in_executor(self.db_executor, functools.partial(fn, *args))
+
+    async def run_io(self, fn, *args):
+        return await self.loop.run_in_executor(self.io_executor, functools.partial(fn, *args))
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self, timeout=None):
+        if self.running:
+            try:
+                self.submit(self._cancel_tasks()).result(timeout or None)
+            except concurrent.futures.TimeoutError:
+                log.warning("Engine tasks still running at shutdown")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout or None)
+        self.db_executor.shutdown(wait=False)
+        self.io_executor.shutdown(wait=False)
+        if not self.loop.is_running():
+            self.loop.close()
+
+class NotificationDispatcher:
+    """Runs notification channels on an EngineLoop, each under its own concurrency limit.
+
+    Channels return True (sent), False (failed) or None (disabled).
+    """
+    def __init__(self, channels, workers=4, channel_limits=None, post=None, loop=None):
+        self.channels = channels
+        self.post = post or (lambda fn: fn())
+        self.workers = workers
+        self.channel_limits = channel_limits or {}
+        self._owns_loop = loop is None
+        self.loop = loop or EngineLoop(io_workers=workers).start()
+        # Semaphores are created on the loop thread, the first time a channel is used
+        self._limits = {}
+        self._pending = 0
+        self._idle = threading.Condition()
+
+    def submit(self, channel, *args, callback=None):
+        # Never dropped: the reminder is already marked notified, so a burst waits on the channel limits
+        with self._idle:
+            self._pending += 1
+        self.loop.submit(self._send(channel, args, callback))
+
+    async def _send(self, channel, args, callback):
+        try:
+            try:
+                limit = self._limits.get(channel)
+                if limit is None:
+                    limit = self._limits[channel] = asyncio.Semaphore(self.channel_limits.get(channel, self.workers))
+                async with limit:
+                    with metrics.timer("channel_seconds", channel=channel):
+                        send = self.channels[channel]
+                        if asyncio.iscoroutinefunction(send):
+                            result = await send(*args)
+                        else:
+                            result = await self.loop.run_io(send, *args)
+            except Exception as e:
+                log.error("%s notification error: %s", channel, e)
+                result = False
+            if result is False:
+                metrics.inc("channel_failures", channel=channel)
+            if callback:
+                self.post(lambda: callback(result))
+        finally:
+            # Counted down only once the callback is handed over, so stop() waits for it too
+            with self._idle:
+                self._pending -= 1
+                self._idle.notify_all()
+
+    def stop(self, timeout=None):
+        """Wait up to ``timeout`` seconds for pending notifications; stops the loop if it is ours"""
+        if timeout:
+            with self._idle:
+                self._idle.wait_for(lambda: self._pending == 0, timeout)
+        if self._owns_loop:
+            self.loop.stop(timeout)
+
+class AlertCoalescer:
+    """Gathers reminders fired within ``window`` seconds of each other into one ``deliver(reminders)`` call"""
+    def __init__(self, window, deliver, loop):
+        self.window = window
+        self.deliver = deliver
+        self.loop = loop
+        self._pending = []
+        self._timer = None
+
+    def add(self, reminders):
+        self.loop.call_soon(self._add, list(reminders))
+
+    def _add(self, reminders):
+        self._pending.extend(reminders)
+        if self.window <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.loop.loop.call_later(self.window, self.flush)
+
+    def flush(self):
+        # Loop thread only
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if batch:
+            self.deliver(batch)
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+class Recurrence:
+    """A recurrence rule in RFC 5545 RRULE syntax whose occurrences are generated lazily.
+
+    Supports FREQ (HOURLY to MONTHLY), INTERVAL, BYDAY, BYMONTHDAY, BYHOUR, BYMINUTE, COUNT, UNTIL and DTSTART.
+    """
+    FREQS = ('HOURLY', 'DAILY', 'WEEKLY', 'MONTHLY')
+    STAMP = '%Y%m%dT%H%M%S'
+    # Stop looking after this many periods without an occurrence (e.g. BYMONTHDAY=31 every two months from June)
+    MAX_EMPTY_PERIODS = 1000
+
+    def __init__(self, freq, interval=1, byday=(), bymonthday=(), byhour=(), byminute=(),
+                 count=None, until=None, dtstart=None):
+        if freq not in self.FREQS:
+            raise ValueError(f"FREQ must be one of {', '.join(self.FREQS)}")
+        if int(interval) < 1:
+            raise ValueError("INTERVAL must be at least 1")
+        if count is not None and int(count) < 1:
+            raise ValueError("COUNT must be at least 1")
+        self.freq = freq
+        self.interval = int(interval)
+        self.byday = tuple(sorted(set(byday)))
+        self.bymonthday = tuple(sorted(set(bymonthday)))
+        self.byhour = tuple(sorted(set(byhour)))
+        self.byminute = tuple(sorted(set(byminute)))
+        self.count = None if count is None else int(count)
+        self.until = until
+        self.dtstart = dtstart
+
+    @classmethod
+    def parse(cls, text):
+        """Parse 'FREQ=WEEKLY;BYDAY=MO,WE,FR', with an optional RRULE: prefix or DTSTART line"""
+        parts = {}
+        for line in text.strip().splitlines() or ['']:
+            line = line.strip()
+            if line.upper().startswith('DTSTART:'):
+                line = 'DTSTART=' + line[8:]
+            elif line.upper().startswith('RRULE:'):
+                line = line[6:]
+            for part in filter(None, line.split(';')):
+                key, sep, value = part.partition('=')
+                if not sep or not value.strip():
+                    raise ValueError(f"Malformed rule part '{part}'")
+                parts[key.strip().upper()] = value.strip().upper()
+
+        def numbers(key, low, high):
+            values = [int(v) for v in parts.pop(key, '').split(',') if v]
+            if any(not low <= v <= high for v in values):
+                raise ValueError(f"{key} values must be between {low} and {high}")
+            return values
+
+        def stamp(key):
+            value = parts.pop(key, None)
+            if value is None:
+                return None
+            return datetime.strptime(value, cls.STAMP if 'T' in value else '%Y%m%d')
+
+        freq = parts.pop('FREQ', None)
+        if freq is None:
+            raise ValueError("A rule needs FREQ")
+        byday = []
+        for day in filter(None, parts.pop('BYDAY', '').split(',')):
+            if day not in WEEKDAYS:
+                raise ValueError(f"Unknown BYDAY value '{day}' (use plain weekdays such as MO,WE,FR)")
+            byday.append(WEEKDAYS.index(day))
+        rule = cls(
+            freq,
+            interval=parts.pop('INTERVAL', 1),
+            byday=byday,
+            bymonthday=numbers('BYMONTHDAY', 1, 31),
+            byhour=numbers('BYHOUR', 0, 23),
+            byminute=numbers('BYMINUTE', 0, 59),
+            count=parts.pop('COUNT', None),
+            until=stamp('UNTIL'),
+            dtstart=stamp('DTSTART')
+        )
+        parts.pop('WKST', None)  # weeks always start on Monday
+        if parts:
+            raise ValueError(f"Unsupported rule parts: {', '.join(sorted(parts))}")
+        return rule
+
+    def __str__(self):
+        parts = [f"DTSTART={self.dtstart:{self.STAMP}}"] if self.dtstart else []
+        parts.append(f"FREQ={self.freq}")
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.byday:
+            parts.append("BYDAY=" + ','.join(WEEKDAYS[d] for d in self.byday))
+        for key, values in (('BYMONTHDAY', self.bymonthday), ('BYHOUR', self.byhour), ('BYMINUTE', self.byminute)):
+            if values:
+                parts.append(f"{key}=" + ','.join(map(str, values)))
+        if self.count:
+            parts.append(f"COUNT={self.count}")
+        if self.until:
+            parts.append(f"UNTIL={self.until:{self.STAMP}}")
+        return ';'.join(parts)
+
+    def anchored(self, dtstart):
+        """A copy of the rule starting at ``dtstart`` (None drops the anchor)"""
+        return Recurrence(self.freq, self.interval, self.byday, self.bymonthday, self.byhour, self.byminute,
+                          self.count, self.until, dtstart)
+
+    def _period_start(self, t):
+        if self.freq == 'HOURLY':
+            return t.replace(minute=0, second=0, microsecond=0)
+        day = t.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.freq == 'DAILY':
+            return day
+        if self.freq == 'WEEKLY':
+            return day - timedelta(days=day.weekday())
+        return day.replace(day=1)
+
+    def _advance(self, period, n):
+        if self.freq == 'HOURLY':
+            return period + timedelta(hours=n)
+        if self.freq == 'DAILY':
+            return period + timedelta(days=n)
+        if self.freq == 'WEEKLY':
+            return period + timedelta(weeks=n)
+        months = period.month - 1 + n
+        return period.replace(year=period.year + months // 12, month=months % 12 + 1)
+
+    def _periods_between(self, a, b):
+        if self.freq == 'HOURLY':
+            return int((b - a).total_seconds() // 3600)
+        if self.freq == 'DAILY':
+            return (b - a).days
+        if self.freq == 'WEEKLY':
+            return (b - a).days // 7
+        return (b.year - a.year) * 12 + b.month - a.month
+
+    def _expand(self, period, start):
+        """Candidate times inside one period, in order"""
+        minutes = self.byminute or (start.minute,)
+        if self.freq == 'HOURLY':
+            if ((self.byday and period.weekday() not in self.byday)
+                    or (self.bymonthday and period.day not in self.bymonthday)
+                    or (self.byhour and period.hour not in self.byhour)):
+                return []
+            return [period.replace(minute=m) for m in minutes]
+        if self.freq == 'DAILY':
+            days = [period]
+        elif self.freq == 'WEEKLY':
+            days = [period + timedelta(days=d) for d in (self.byday or (start.weekday(),))]
+        else:
+            length = (self._advance(period, 1) - period).days
+            if self.bymonthday or self.byday:
+                days = [period + timedelta(days=i) for i in range(length)]
+            else:
+                days = [period.replace(day=start.day)] if start.day <= length else []
+        days = [day for day in days
+                if (not self.byday or day.weekday() in self.byday)
+                and (not self.bymonthday or day.day in self.bymonthday)]
+        hours = self.byhour or (start.hour,)
+        return [day.replace(hour=h, minute=m) for day in days for h in hours for m in minutes]
+
+    def occurrences(self, start, after=None):
+        """Generate occurrences of the series anchored at DTSTART or ``start``, only those after ``after`` if given"""
+        start = self.dtstart or start
+        period = self._period_start(start)
+        if after is not None and self.count is None and after > start:
+            # Jump to the interval-aligned period holding ``after`` instead of walking the series
+            skip = self._periods_between(period, self._period_start(after)) // self.interval
+            period = self._advance(period, skip * self.interval)
+        produced = empty = 0
+        while empty < self.MAX_EMPTY_PERIODS:
+            if self.until and period > self.until:
+                return
+            found = False
+            for t in self._expand(period, start):
+                if t < start:
+                    continue
+                if self.until and t > self.until:
+                    return
+                found = True
+                produced += 1
+                if self.count and produced > self.count:
+                    return
+                if after is None or t > after:
+                    yield t
+            empty = 0 if found else empty + 1
+            period = self._advance(period, self.interval)
+
+    def next_after(self, start, after):
+        """The first occurrence strictly after ``after``, or None once the series has ended"""
+        return next(self.occurrences(start, after), None)
+
+    def between(self, start, after, before):
+        """Occurrences strictly between ``after`` and ``before``"""
+        for t in self.occurrences(start, after):
+            if t >= before:
+                return
+            yield t
+
+    def describe(self):
+        unit = {'HOURLY': 'hour', 'DAILY': 'day', 'WEEKLY': 'week', 'MONTHLY': 'month'}[self.freq]
+        text = f"every {unit}" if self.interval == 1 else f"every {self.interval} {unit}s"
+        if self.byday:
+            text += " on " + ', '.join(WEEKDAYS[d].title() for d in self.byday)
+        if self.bymonthday:
+            text += " on day " + ', '.join(map(str, self.bymonthday))
+        if self.byhour:
+            text += " at " + ', '.join(f"{h}h" for h in self.byhour)
+        if self.count:
+            text += f", {self.count} times"
+        if self.until:
+            text += f" until {self.until:%Y-%m-%d}"
+        return text
+
+@functools.lru_cache(maxsize=1024)
+def recurrence_for(repeat, interval=0, rule=None):
+    """The Recurrence behind a reminder's repeat settings, or None for 'Once'"""
+    if repeat == 'Rule':
+        return Recurrence.parse(rule or '')
+    if repeat == 'Daily':
+        return Recurrence('DAILY')
+    if repeat == 'Weekly':
+        return Recurrence('WEEKLY')
+    if repeat == 'Custom':
+        return Recurrence('DAILY', interval=interval or 1)
+    return None
+
+class Reminder:
+    """A reminder with its fire time held as a datetime; treat it as immutable and use ``replace()``.
+
+    ``patient_id`` None is the default patient; fields the app does not model are kept in ``extra``.
+    """
+    __slots__ = ('id', 'name', 'dosage', 'time', 'repeat', 'interval', 'notified', 'taken', 'enabled',
+                 'patient_id', 'rule', 'dedup_key', 'extra')
+    FIELDS = ('name', 'dosage', 'time', 'repeat', 'interval', 'notified', 'taken', 'enabled', 'patient_id', 'rule',
+              'dedup_key')
+    # Stored alongside the fields but recomputed on every write, or owned by the claim protocol
+    DERIVED = ('id', '_id', 'shard', 'claimed_by', 'lease_until')
+    REMOVED = object()
+
+    def __init__(self, name, dosage, time, repeat='Once', interval=0, notified=False, taken=False,
+                 enabled=True, patient_id=None, rule=None, dedup_key=None, id=None, extra=None):
+        self.id = id
+        self.name = name
+        self.dosage = dosage
+        self.time = time
+        self.repeat = repeat
+        self.interval = int(interval or 0)
+        self.notified = bool(notified)
+        self.taken = bool(taken)
+        self.enabled = bool(enabled)
+        self.patient_id = patient_id
+        self.rule = self.anchor_rule(rule, time) if repeat == 'Rule' else rule or None
+        self.dedup_key = dedup_key or self.make_dedup_key(patient_id, name, time)
+        self.extra = extra or {}
+
+    @classmethod
+    def from_dict(cls, data, id=None):
+        """Build a Reminder from a stored document; 'time' may be a datetime or a TIME_FORMAT string"""
+        fields = {key: data[key] for key in cls.FIELDS if key in data}
+        if isinstance(fields.get('time'), str):
+            fields['time'] = datetime.strptime(fields['time'], TIME_FORMAT)
+        extra = {key: value for key, value in data.items() if key not in cls.FIELDS and key not in cls.DERIVED}
+        return cls(id=id if id is not None else data.get('id'), extra=extra, **fields)
+
+    @staticmethod
+    def anchor_rule(rule, time):
+        """``rule`` with a DTSTART at ``time`` if it has none, so COUNT and INTERVAL count from a fixed start"""
+        if not rule or 'DTSTART' in rule.upper():
+            return rule or None
+        try:
+            return str(Recurrence.parse(rule).anchored(time))
+        except ValueError:
+            return rule  # validate_reminder_fields reports it
+
+    @staticmethod
+    def make_dedup_key(patient_id, name, time):
+        """Two reminders for the same patient, medicine (any case/spacing) and time of day are duplicates"""
+        return f"{patient_id or ''}|{' '.join(name.lower().split())}|{time:%H:%M}"
+
+    def to_dict(self):
+        """Document form without the id; 'time' stays a datetime"""
+        data = dict(self.extra)
+        for key in self.FIELDS:
+            data[key] = getattr(self, key)
+        return data
+
+    def replace(self, **changes):
+        values = {key: getattr(self, key) for key in self.__slots__}
+        values.update(changes)
+        return Reminder(**values)
+
+    def changes_from(self, old):
+        """Fields (and ``extra`` keys) that differ from ``old``; dropped extra keys map to ``Reminder.REMOVED``"""
+        changes = {key: getattr(self, key) for key in self.FIELDS if getattr(self, key) != getattr(old, key)}
+        for key in self.extra.keys() | old.extra.keys():
+            value = self.extra.get(key, self.REMOVED)
+            if value != old.extra.get(key, self.REMOVED):
+                changes[key] = value
+        return changes
+
+    @property
+    def shard(self):
+        return shard_of(self.patient_id)
+
+    @property
+    def recurrence(self):
+        return recurrence_for(self.repeat, self.interval, self.rule)
+
+    @property
+    def time_str(self):
+        return self.time.strftime(TIME_FORMAT)
+
+    def __eq__(self, other):
+        if not isinstance(other, Reminder):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self):
+        return f"Reminder(id={self.id!r}, name={self.name!r}, time={self.time_str!r}, repeat={self.repeat!r})"
+
+REPEAT_OPTIONS = ['Once', 'Daily', 'Weekly', 'Custom', 'Rule']
+
+def validate_reminder_fields(name, dosage, hour, minute, repeat='Once', interval=0, rule=None):
+    """Return an error message for invalid reminder input, or None if it is valid"""
+    if not name:
+        return "Please enter a medicine name."
+    if not dosage:
+        return "Please enter the dosage."
+    try:
+        hour = int(hour)
+        minute = int(minute)
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError
+    except (TypeError, ValueError):
+        return "Please enter valid time."
+    if repeat not in REPEAT_OPTIONS:
+        return f"Repeat must be one of {', '.join(REPEAT_OPTIONS)}."
+    if repeat == 'Custom':
+        try:
+            if int(interval) < 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            return "Please enter a valid custom interval (positive number)."
+    if repeat == 'Rule':
+        try:
+            recurrence = Recurrence.parse(rule or '')
+        except ValueError as e:
+            return f"Invalid recurrence rule: {e}"
+        if next_fire_time(int(hour), int(minute), recurrence=recurrence) is None:
+            return "This recurrence rule has no upcoming occurrences."
+    return None
+
+def next_fire_time(hour, minute, now=None, recurrence=None):
+    """The next time today or tomorrow at hour:minute, or the rule's next occurrence (None once it has ended)"""
+    now = now or datetime.now()
+    scheduled_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if recurrence is not None:
+        return recurrence.next_after(scheduled_time, now)
+    if scheduled_time < now:
+        scheduled_time += timedelta(days=1)
+    return scheduled_time
+
+class DuplicateReminderError(ValueError):
+    """Raised when a reminder's dedup key already belongs to another reminder"""
+    def __init__(self, key=None):
+        super().__init__("A reminder with the same name and time already exists.")
+        self.key = key
+
+DOSE_STATUSES = ('fired', 'taken', 'snoozed', 'missed')
+# adherence()/adherence_streaks() filter: every patient, as opposed to None (the default patient)
+ANY_PATIENT = object()
+
+def dose_event(reminder, status, now, scheduled=None):
+    """A dose history entry for ``reminder``'s current occurrence (or ``scheduled``)"""
+    return {'reminder_id': reminder.id, 'patient_id': reminder.patient_id, 'name': reminder.name,
+            'dosage': reminder.dosage, 'scheduled': scheduled or reminder.time, 'status': status,
+            'recorded': now}
+
+def daily_buckets(events):
+    """Fold a batch of dose events into per (day of the dose, reminder) counts, as the rollups store them"""
+    buckets = {}
+    for event in events:
+        key = (event['scheduled'].strftime('%Y-%m-%d'), event['reminder_id'])
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = dict({'day': key[0], 'reminder_id': key[1], 'patient_id': event.get('patient_id'),
+                                          'name': event['name']}, **dict.fromkeys(DOSE_STATUSES, 0))
+        bucket[event['status']] += 1
+    return list(buckets.values())
+
+def adherence_rate(row):
+    """Share of settled doses that were taken; None while nothing has been taken or missed"""
+    settled = row['taken'] + row['missed']
+    return round(row['taken'] / settled, 4) if settled else None
+
+class ReminderDatabase:
+    """Backend-independent reminder store with a write-through in-memory cache.
+
+    Subclasses implement the storage hooks (_insert, _update, _delete, _load_all, _claim_due, close).
+    """
+    def __init__(self):
+        self.on_change = None
+        self.event_retention_days = DB_CONFIG["event_retention_days"]
+        self._cache = None
+        self._keys = None
+        self._lock = threading.RLock()
+        # Held around backend calls, and taken after self._lock when both are needed, so cache
+        # reads never wait on a round trip; backends whose driver is thread-safe (Mongo) replace it
+        self._io_lock = threading.RLock()
+        # True when edits made by other clients reach on_change (a Mongo change stream)
+        self.follows_changes = False
+
+    def _load_cache(self):
+        with self._lock:
+            if self._cache is None:
+                self._cache = {}
+                self._keys = {}
+                with self._io_lock, metrics.timer("db_seconds", op="load_all"):
+                    reminders = self._load_all()
+                for reminder in reminders:
+                    self._cache_put(reminder.id, reminder)
+            return self._cache
+
+    def _cache_put(self, idx, reminder):
+        # Caller holds self._lock and the cache is loaded
+        old = self._cache.get(idx)
+        if old is not None and self._keys.get(old.dedup_key) == idx:
+            del self._keys[old.dedup_key]
+        self._cache[idx] = reminder
+        self._keys[reminder.dedup_key] = idx
+
+    def _cache_pop(self, idx):
+        old = self._cache.pop(idx, None)
+        if old is not None and self._keys.get(old.dedup_key) == idx:
+            del self._keys[old.dedup_key]
+
+    def find_duplicate(self, reminder):
+        """Id of another reminder with the same dedup key, or None"""
+        with self._lock:
+            self._load_cache()
+            owner = self._keys.get(reminder.dedup_key)
+            return owner if owner != reminder.id else None
+
+    def refresh(self):
+        """Drop the cache and re-read every reminder from the backend"""
+        with self._lock:
+            self._cache = None
+            return self._load_cache()
+
+    def add_reminder(self, reminder):
+        """Insert a reminder and return its id; raises DuplicateReminderError if its dedup key is taken"""
+        with self._lock:
+            if self.find_duplicate(reminder):
+                raise DuplicateReminderError(reminder.dedup_key)
+            with self._io_lock, metrics.timer("db_seconds", op="insert"):
+                idx = self._insert(reminder)
+            self._cache_put(idx, reminder.replace(id=idx))
+        return idx
+
+    def add_reminders(self, reminders):
+        """Insert a batch; returns one (id, error) pair per reminder, in order"""
+        with self._lock:
+            self._load_cache()
+            results = [None] * len(reminders)
+            fresh = []
+            batch_keys = set()
+            for i, reminder in enumerate(reminders):
+                if reminder.dedup_key in self._keys or reminder.dedup_key in batch_keys:
+                    results[i] = (None, str(DuplicateReminderError(reminder.dedup_key)))
+                else:
+                    batch_keys.add(reminder.dedup_key)
+                    fresh.append((i, reminder))
+            with self._io_lock, metrics.timer("db_seconds", op="insert_many"):
+                inserted = self._insert_many([reminder for _, reminder in fresh])
+            for (i, reminder), (idx, error) in zip(fresh, inserted):
+                results[i] = (idx, error)
+                if idx is not None:
+                    self._cache_put(idx, reminder.replace(id=idx))
+        return results
+
+    def iter_reminders(self, batch_size=1000):
+        """Stream every reminder straight from the backend without filling the cache"""
+        return self._iter_all(batch_size)
+
+    def _changes(self, idx, reminder):
+        # Caller holds self._lock; without a cached copy every field is written
+        old = self._cache.get(idx) if self._cache is not None else None
+        return reminder.to_dict() if old is None else reminder.changes_from(old)
+
+    def update_reminder(self, idx, reminder):
+        with self._lock:
+            reminder = reminder.replace(id=idx)
+            if self.find_duplicate(reminder):
+                raise DuplicateReminderError(reminder.dedup_key)
+            changes = self._changes(idx, reminder)
+        if not changes:
+            return
+        # The round trip runs outside self._lock so readers on the Tk thread are not held up
+        with self._io_lock, metrics.timer("db_seconds", op="update"):
+            self._update(idx, reminder, changes)
+        with self._lock:
+            if self._cache is not None and idx in self._cache:
+                self._cache_put(idx, reminder)
+
+    def batch(self, release=False):
+        """A WriteBatch that sends its updates and dose events when the ``with`` block ends"""
+        return WriteBatch(self, release)
+
+    def add_dose_events(self, events):
+        """Append dose history entries (see dose_event) and add them to the daily rollups"""
+        if not events:
+            return
+        with self._io_lock, metrics.timer("db_seconds", op="insert_events"):
+            self._insert_events(events)
+
+    def prune_dose_events(self, now=None):
+        """Drop raw dose events past the retention window; returns how many went (Mongo expires them itself)"""
+        if not self.event_retention_days:
+            return 0
+        cutoff = (now or datetime.now()) - timedelta(days=self.event_retention_days)
+        with self._io_lock, metrics.timer("db_seconds", op="prune_events"):
+            return self._prune_events(cutoff)
+
+    def adherence(self, by='medicine', start=None, end=None, patient_id=ANY_PATIENT):
+        """Dose counts and adherence rate per medicine or per day, between the inclusive ``start``/``end`` dates"""
+        keys = {'medicine': ('reminder_id',), 'day': ('day',)}[by]
+        with self._io_lock, metrics.timer("db_seconds", op="aggregate_doses"):
+            rows = self._aggregate_doses(keys, start and start.isoformat(), end and end.isoformat(), patient_id)
+        for row in rows:
+            row['adherence'] = adherence_rate(row)
+        return rows
+
+    def adherence_streaks(self, today=None, patient_id=ANY_PATIENT):
+        """Current and longest run of days with every dose taken and none missed, per medicine"""
+        today = today or date.today()
+        with self._io_lock, metrics.timer("db_seconds", op="aggregate_doses"):
+            rows = self._aggregate_doses(('reminder_id', 'day'), None, today.isoformat(), patient_id)
+        streaks = {}
+        # Rows come sorted by reminder, then day: one pass over the days each medicine has history for
+        for row in rows:
+            entry = streaks.get(row['reminder_id'])
+            if entry is None:
+                entry = streaks[row['reminder_id']] = {'reminder_id': row['reminder_id'], 'name': row['name'],
+                                                       'current': 0, 'longest': 0, '_run': 0, '_last': None}
+            entry['name'] = row['name']
+            day = date.fromisoformat(row['day'])
+            if row['taken'] and not row['missed']:
+                follows = entry['_last'] is not None and (day - entry['_last']).days == 1
+                entry['_run'] = entry['_run'] + 1 if follows else 1
+                entry['_last'] = day
+                entry['longest'] = max(entry['longest'], entry['_run'])
+            elif day != today:
+                entry['_run'], entry['_last'] = 0, None
+        for entry in streaks.values():
+            last = entry.pop('_last')
+            run = entry.pop('_run')
+            entry['current'] = run if last is not None and (today - last).days <= 1 else 0
+        return list(streaks.values())
+
+    def delete_reminder(self, idx):
+        with self._io_lock, metrics.timer("db_seconds", op="delete"):
+            self._delete(idx)
+        with self._lock:
+            if self._cache is not None:
+                self._cache_pop(idx)
+
+    def get_reminders(self):
+        with self._lock:
+            return list(self._load_cache().values())
+
+    def get_reminder_by_id(self, idx):
+        with self._lock:
+            return self._load_cache().get(idx)
+
+    def claim_due(self, now, owner, lease, partition=None):
+        """Lease due reminders to ``owner`` until ``now + lease``, skipping those another owner still holds.
+
+        Returns (claimed reminders, earliest expiry of the other owners' leases or None).
+        """
+        token = f"{owner}/{uuid.uuid4().hex[:8]}"
+        with self._io_lock, metrics.timer("db_seconds", op="claim_due"):
+            return self._claim_due(now, token, now + lease, partition)
+
+    def add_patient(self, patient):
+        """Store a patient dict (name, email, phone) and return its id"""
+        with self._io_lock:
+            return self._insert_patient(patient)
+
+    def get_patients(self):
+        with self._io_lock:
+            return self._load_patients()
+
+    def get_patient(self, idx):
+        """One patient by id (a single keyed lookup), or None"""
+        with self._io_lock, metrics.timer("db_seconds", op="load_patient"):
+            return self._load_patient(idx)
+
+    def _apply_external(self, idx, reminder):
+        with self._lock:
+            if self._cache is None:
+                return
+            if reminder is None:
+                self._cache_pop(idx)
+            else:
+                self._cache_put(idx, reminder)
+        if self.on_change:
+            self.on_change(idx, reminder)
+
+    def _insert(self, reminder):
+        raise NotImplementedError
+
+    def _insert_many(self, reminders):
+        results = []
+        for reminder in reminders:
+            try:
+                results.append((self._insert(reminder), None))
+            except Exception as e:
+                results.append((None, str(e)))
+        return results
+
+    def _iter_all(self, batch_size):
+        return iter(self._load_all())
+
+    def _update(self, idx, reminder, changes):
+        raise NotImplementedError
+
+    def _update_many(self, updates, release):
+        """Apply (reminder, changes) pairs in one round trip; ``changes`` may be empty when only releasing"""
+        raise NotImplementedError
+
+    def _delete(self, idx):
+        raise NotImplementedError
+
+    def _load_all(self):
+        raise NotImplementedError
+
+    def _claim_due(self, now, token, until, partition):
+        raise NotImplementedError
+
+    def _insert_patient(self, patient):
+        raise NotImplementedError
+
+    def _load_patients(self):
+        raise NotImplementedError
+
+    def _load_patient(self, idx):
+        raise NotImplementedError
+
+    def _insert_events(self, events):
+        raise NotImplementedError
+
+    def _prune_events(self, cutoff):
+        raise NotImplementedError
+
+    def _aggregate_doses(self, keys, start, end, patient_id):
+        """Summed rollup counts grouped and sorted by ``keys``, between inclusive 'YYYY-MM-DD' ``start``/``end``"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class WriteBatch:
+    """Reminder updates and dose events sent to the backend in one bulk write on flush"""
+    def __init__(self, db, release=False):
+        self.db = db
+        self.release = release
+        self.reminders = {}
+        self.events = []
+
+    def update(self, reminder):
+        self.reminders[reminder.id] = reminder
+
+    def add_events(self, events):
+        self.events.extend(events)
+
+    def __len__(self):
+        return len(self.reminders)
+
+    def flush(self):
+        db = self.db
+        reminders, self.reminders = list(self.reminders.values()), {}
+        events, self.events = self.events, []
+        with db._lock:
+            updates = []
+            for reminder in reminders:
+                changes = db._changes(reminder.id, reminder)
+                if changes or self.release:
+                    updates.append((reminder, changes))
+        if updates:
+            # Diffed under the cache lock, written without it, then applied to the cache
+            with db._io_lock, metrics.timer("db_seconds", op="update_many"):
+                db._update_many(updates, self.release)
+            with db._lock:
+                if db._cache is not None:
+                    for reminder, _ in updates:
+                        if reminder.id in db._cache:
+                            db._cache_put(reminder.id, reminder)
+        db.add_dose_events(events)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+class MongoReminderDatabase(ReminderDatabase):
+    """MongoDB backend; optionally follows a change stream (needs a replica set)"""
+    # Bump when a new back-fill is added to migrate_time_fields
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_url='mongodb://localhost:27017/', db_name='reminder_db', collection_name='reminders',
+                 watch_changes=False):
+        super().__init__()
+        # MongoClient is thread-safe, so only cache updates need self._lock
+        self._io_lock = contextlib.nullcontext()
+        self.client = _mongo().MongoClient(db_url)
+        self.db = self.client[db_name]
+        self.collection = self.db[collection_name]
+        self.patients = self.db['patients']
+        self.dose_events = self.db['dose_events']
+        self.dose_daily = self.db['dose_daily']
+        self.meta = self.db['meta']
+        self.migrate()
+        self.ensure_indexes()
+        self.migrate_dose_rollups()
+
+        self._watcher = None
+        if watch_changes:
+            self.follows_changes = True
+            self._watcher = threading.Thread(target=self._watch_changes, daemon=True)
+            self._watcher.start()
+
+    def ensure_indexes(self):
+        asc = _mongo().ASCENDING
+        # Equality fields first, then the range field, so the claim query is a single index scan
+        self.collection.create_index(
+            [('enabled', asc), ('notified', asc), ('taken', asc), ('time', asc)],
+            name='due_reminders'
+        )
+        self.collection.create_index([('patient_id', asc), ('time', asc)], name='patient_reminders')
+        self.collection.create_index('dedup_key', name='dedup_key', unique=True,
+                                     partialFilterExpression={'dedup_key': {'$type': 'string'}})
+        self.dose_events.create_index([('reminder_id', asc), ('scheduled', asc)], name='reminder_events')
+        self.dose_daily.create_index([('day', asc), ('reminder_id', asc)],
+                                     name='day_reminder', unique=True)
+        self.dose_daily.create_index([('patient_id', asc), ('day', asc)], name='patient_days')
+        self.ensure_event_ttl()
+
+    def ensure_event_ttl(self):
+        """Let the server expire raw dose events after the retention window"""
+        ttl = self.event_retention_days * 86400
+        current = self.dose_events.index_information().get('recorded_ttl')
+        if current is None:
+            if ttl:
+                self.dose_events.create_index('recorded', name='recorded_ttl', expireAfterSeconds=ttl)
+        elif not ttl:
+            self.dose_events.drop_index('recorded_ttl')
+        elif current.get('expireAfterSeconds') != ttl:
+            self.db.command('collMod', self.dose_events.name,
+                            index={'name': 'recorded_ttl', 'expireAfterSeconds': ttl})
+
+    def migrate(self):
+        """Run the reminder back-fills once per schema version, recorded in the 'meta' collection"""
+        schema = self.meta.find_one({'_id': 'schema'}) or {}
+        if schema.get('version', 0) >= self.SCHEMA_VERSION:
+            return
+        self.migrate_time_fields()
+        self.meta.update_one({'_id': 'schema'}, {'$set': {'version': self.SCHEMA_VERSION}}, upsert=True)
+
+    def migrate_time_fields(self):
+        """Convert legacy '%Y-%m-%d %H:%M' string times to BSON datetimes and back-fill missing fields"""
+        updates = []
+        for doc in self.collection.find({'time': {'$type': 'string'}}, {'time': 1}):
+            try:
+                t = datetime.strptime(doc['time'], TIME_FORMAT)
+            except ValueError:
+                log.warning("Skipping reminder with unreadable time: %s", doc['_id'])
+                continue
+            updates.append(_mongo().UpdateOne({'_id': doc['_id']}, {'$set': {'time': t}}))
+        if updates:
+            self.collection.bulk_write(updates, ordered=False)
+            log.info("Migrated %d reminder times to datetime", len(updates))
+        self.collection.update_many({'enabled': {'$exists': False}}, {'$set': {'enabled': True}})
+        # Reminders created before patients existed belong to the default patient
+        self.collection.update_many({'shard': {'$exists': False}},
+                                    {'$set': {'patient_id': None, 'shard': shard_of(None)}})
+        self.migrate_dedup_keys()
+        self.migrate_rule_anchors()
+
+    def migrate_dedup_keys(self):
+        """Give reminders created before dedup keys existed a key"""
+        taken = {doc['dedup_key'] for doc in self.collection.find({'dedup_key': {'$type': 'string'}}, {'dedup_key': 1})}
+        updates = []
+        for doc in self.collection.find({'dedup_key': {'$not': {'$type': 'string'}}}):
+            key = self._from_doc(doc).dedup_key
+            # Existing duplicates stay, but under a key of their own
+            if key in taken:
+                key = f"{key}#{doc['_id']}"
+            taken.add(key)
+            updates.append(_mongo().UpdateOne({'_id': doc['_id']}, {'$set': {'dedup_key': key}}))
+        if updates:
+            self.collection.bulk_write(updates, ordered=False)
+            log.info("Added dedup keys to %d reminders", len(updates))
+
+    def migrate_rule_anchors(self):
+        """Store a DTSTART on rules saved without one, anchored at the reminder's current time"""
+        updates = [_mongo().UpdateOne({'_id': doc['_id']}, {'$set': {'rule': self._from_doc(doc).rule}})
+                   for doc in self.collection.find({'repeat': 'Rule',
+                                                    'rule': {'$not': {'$regex': 'DTSTART', '$options': 'i'}}})]
+        if updates:
+            self.collection.bulk_write(updates, ordered=False)
+            log.info("Anchored %d recurrence rules", len(updates))
+
+    def migrate_dose_rollups(self):
+        """Build the daily rollups from dose events recorded before they existed (runs once)"""
+        if self.dose_daily.estimated_document_count() or not self.dose_events.estimated_document_count():
+            return
+        counts = {status: {'$sum': {'$cond': [{'$eq': ['$status', status]}, 1, 0]}} for status in DOSE_STATUSES}
+        self.dose_events.aggregate([
+            {'$sort': {'recorded': 1}},
+            {'$group': dict({'_id': {'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$scheduled'}},
+                                     'reminder_id': '$reminder_id'},
+                             'patient_id': {'$last': '$patient_id'}, 'name': {'$last': '$name'}}, **counts)},
+            {'$project': dict({'_id': 0, 'day': '$_id.day', 'reminder_id': '$_id.reminder_id',
+                               'patient_id': 1, 'name': 1}, **dict.fromkeys(DOSE_STATUSES, 1))},
+            {'$merge': {'into': self.dose_daily.name, 'on': ['day', 'reminder_id']}}
+        ])
+        log.info("Built daily dose rollups from existing events")
+
+    @staticmethod
+    def _to_doc(reminder):
+        doc = reminder.to_dict()
+        doc['shard'] = reminder.shard
+        return doc
+
+    @staticmethod
+    def _update_doc(reminder, changes, release=False):
+        """$set/$unset for the changed fields; 'shard' follows 'patient_id'"""
+        fields = {key: value for key, value in changes.items() if value is not Reminder.REMOVED}
+        if 'patient_id' in changes:
+            fields['shard'] = reminder.shard
+        if release:
+            fields.update(claimed_by=None, lease_until=None)
+        update = {'$set': fields} if fields else {}
+        removed = [key for key, value in changes.items() if value is Reminder.REMOVED]
+        if removed:
+            update['$unset'] = dict.fromkeys(removed, '')
+        return update
+
+    @staticmethod
+    def _from_doc(doc):
+        return Reminder.from_dict(doc, id=str(doc['_id']))
+
+    def _insert(self, reminder):
+        try:
+            return str(self.collection.insert_one(self._to_doc(reminder)).inserted_id)
+        except _mongo().DuplicateKeyError:
+            raise DuplicateReminderError(reminder.dedup_key) from None
+
+    def _insert_many(self, reminders):
+        docs = [self._to_doc(reminder) for reminder in reminders]
+        errors = {}
+        try:
+            self.collection.insert_many(docs, ordered=False)
+        except _mongo().BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                if error.get('code') == 11000:
+                    errors[error['index']] = str(DuplicateReminderError())
+                else:
+                    errors[error['index']] = error.get('errmsg', 'write error')
+        # insert_many assigns _id on each document before sending it
+        return [(None, errors[i]) if i in errors else (str(doc['_id']), None) for i, doc in enumerate(docs)]
+
+    def _iter_all(self, batch_size):
+        for doc in self.collection.find().batch_size(batch_size):
+            yield self._from_doc(doc)
+
+    def _update(self, idx, reminder, changes):
+        try:
+            self.collection.update_one(
+                {'_id': _mongo().ObjectId(idx)},
+                self._update_doc(reminder, changes)
+            )
+        except _mongo().DuplicateKeyError:
+            raise DuplicateReminderError(reminder.dedup_key) from None
+
+    def _update_many(self, updates, release):
+        requests = [_mongo().UpdateOne({'_id': _mongo().ObjectId(reminder.id)},
+                                       self._update_doc(reminder, changes, release))
+                    for reminder, changes in updates]
+        self.collection.bulk_write(requests, ordered=False)
+
+    def _delete(self, idx):
+        self.collection.delete_one({'_id': _mongo().ObjectId(idx)})
+
+    def _load_all(self):
+        return [self._from_doc(doc) for doc in self.collection.find()]
+
+    def _claim_due(self, now, token, until, partition):
+        due = {'enabled': True, 'notified': False, 'taken': False, 'time': {'$lte': now}}
+        if partition:
+            due['shard'] = {'$mod': [partition[1], partition[0]]}
+        # A missing or null lease_until matches {'$not': {'$gt': now}} too
+        claimable = dict(due, lease_until={'$not': {'$gt': now}})
+        claimed = []
+        while True:
+            doc = self.collection.find_one_and_update(
+                claimable,
+                {'$set': {'claimed_by': token, 'lease_until': until}},
+                sort=[('time', _mongo().ASCENDING)],
+                return_document=_mongo().ReturnDocument.AFTER
+            )
+            if doc is None:
+                break
+            claimed.append(self._from_doc(doc))
+        held = self.collection.find_one(dict(due, lease_until={'$gt': now}, claimed_by={'$ne': token}),
+                                        {'lease_until': 1},
+                                        sort=[('lease_until', _mongo().ASCENDING)])
+        return claimed, held['lease_until'] if held else None
+
+    def _insert_patient(self, patient):
+        doc = {k: v for k, v in patient.items() if k != 'id'}
+        return str(self.patients.insert_one(doc).inserted_id)
+
+    def _load_patients(self):
+        patients = []
+        for doc in self.patients.find():
+            doc['id'] = str(doc.pop('_id'))
+            patients.append(doc)
+        return patients
+
+    def _load_patient(self, idx):
+        if not _mongo().ObjectId.is_valid(idx):
+            return None
+        doc = self.patients.find_one({'_id': _mongo().ObjectId(idx)})
+        if doc is not None:
+            doc['id'] = str(doc.pop('_id'))
+        return doc
+
+    def _insert_events(self, events):
+        self.dose_events.insert_many([dict(event) for event in events], ordered=False)
+        self.dose_daily.bulk_write([
+            _mongo().UpdateOne({'day': bucket['day'], 'reminder_id': bucket['reminder_id']},
+                               {'$inc': {status: bucket[status] for status in DOSE_STATUSES},
+                                '$set': {'patient_id': bucket['patient_id'], 'name': bucket['name']}},
+                               upsert=True)
+            for bucket in daily_buckets(events)
+        ], ordered=False)
+
+    def _prune_events(self, cutoff):
+        # The recorded_ttl index expires events on the server
+        return 0
+
+    def _aggregate_doses(self, keys, start, end, patient_id):
+        match = {}
+        if start or end:
+            match['day'] = {op: value for op, value in (('$gte', start), ('$lte', end)) if value}
+        if patient_id is not ANY_PATIENT:
+            match['patient_id'] = patient_id
+        group = {'_id': {key: f'${key}' for key in keys}, 'name': {'$last': '$name'}}
+        group.update({status: {'$sum': f'${status}'} for status in DOSE_STATUSES})
+        pipeline = [{'$match': match}, {'$sort': {'day': 1}}, {'$group': group},
+                    {'$sort': {f'_id.{key}': 1 for key in keys}}]
+        rows = []
+        for doc in self.dose_daily.aggregate(pipeline):
+            row = dict(doc.pop('_id'))
+            if 'reminder_id' not in keys:
+                doc.pop('name')
+            row.update(doc)
+            rows.append(row)
+        return rows
+
+    def _watch_changes(self):
+        try:
+            with self.collection.watch(full_document='updateLookup') as stream:
+                for change in stream:
+                    doc = change.get('fullDocument')
+                    reminder = None
+                    if change['operationType'] != 'delete' and doc is not None:
+                        reminder = self._from_doc(doc)
+                    self._apply_external(str(change['documentKey']['_id']), reminder)
+        except _mongo().PyMongoError as e:
+            # Raised straight away on a standalone server, or when close() is called
+            log.warning("Change stream stopped: %s", e)
+
+    def close(self):
+        self.client.close()
+
+class SQLiteReminderDatabase(ReminderDatabase):
+    """Embedded single-file backend for single-node installs (WAL mode, indexed on time)"""
+    COLUMNS = ('name', 'dosage', 'time', 'repeat', 'interval', 'notified', 'taken', 'enabled', 'patient_id', 'shard',
+               'rule', 'dedup_key')
+
+    def __init__(self, path='reminders.db'):
+        super().__init__()
+        # Shared between the Tk and scheduler threads; self._io_lock serialises access
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reminders (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                dosage TEXT NOT NULL,
+                time TEXT NOT NULL,
+                repeat TEXT NOT NULL DEFAULT 'Once',
+                interval INTEGER NOT NULL DEFAULT 0,
+                notified INTEGER NOT NULL DEFAULT 0,
+                taken INTEGER NOT NULL DEFAULT 0,
+                enabled INTEGER NOT NULL DEFAULT 1,
+                extra TEXT
+            );
+            CREATE TABLE IF NOT EXISTS patients (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                email TEXT,
+                phone TEXT
+            );
+            CREATE TABLE IF NOT EXISTS dose_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reminder_id TEXT NOT NULL,
+                patient_id TEXT,
+                name TEXT NOT NULL,
+                dosage TEXT,
+                scheduled TEXT NOT NULL,
+                status TEXT NOT NULL,
+                recorded TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_dose_events_reminder ON dose_events (reminder_id, scheduled);
+        """)
+        rollups_exist = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dose_daily'").fetchone()
+        self.conn.executescript(f"""
+            CREATE INDEX IF NOT EXISTS idx_dose_events_recorded ON dose_events (recorded);
+            CREATE TABLE IF NOT EXISTS dose_daily (
+                day TEXT NOT NULL,
+                reminder_id TEXT NOT NULL,
+                patient_id TEXT,
+                name TEXT NOT NULL,
+                {', '.join(f"{status} INTEGER NOT NULL DEFAULT 0" for status in DOSE_STATUSES)},
+                PRIMARY KEY (day, reminder_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_dose_daily_patient ON dose_daily (patient_id, day);
+        """)
+        if not rollups_exist:
+            self.migrate_dose_rollups()
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(reminders)")}
+        if 'patient_id' not in columns:
+            self.conn.execute("ALTER TABLE reminders ADD COLUMN patient_id TEXT")
+            self.conn.execute(f"ALTER TABLE reminders ADD COLUMN shard INTEGER NOT NULL DEFAULT {shard_of(None)}")
+        if 'rule' not in columns:
+            self.conn.execute("ALTER TABLE reminders ADD COLUMN rule TEXT")
+        if 'dedup_key' not in columns:
+            self.conn.execute("ALTER TABLE reminders ADD COLUMN dedup_key TEXT")
+            self.migrate_dedup_keys()
+        if 'lease_until' not in columns:
+            self.conn.execute("ALTER TABLE reminders ADD COLUMN claimed_by TEXT")
+            self.conn.execute("ALTER TABLE reminders ADD COLUMN lease_until TEXT")
+        self.migrate_rule_anchors()
+        self.conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_reminders_time ON reminders (time);
+            CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders (enabled, notified, taken, time);
+            CREATE INDEX IF NOT EXISTS idx_reminders_patient ON reminders (patient_id, time);
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_reminders_dedup ON reminders (dedup_key);
+        """)
+        self.conn.commit()
+
+    def migrate_dedup_keys(self):
+        """Give reminders created before dedup keys existed a key"""
+        taken = set()
+        updates = []
+        for row in self.conn.execute("SELECT * FROM reminders ORDER BY rowid"):
+            key = self._from_row(row).dedup_key
+            if key in taken:
+                key = f"{key}#{row['id']}"
+            taken.add(key)
+            updates.append((key, row['id']))
+        self.conn.executemany("UPDATE reminders SET dedup_key = ? WHERE id = ?", updates)
+        if updates:
+            log.info("Added dedup keys to %d reminders", len(updates))
+
+    def migrate_rule_anchors(self):
+        """Store a DTSTART on rules saved without one, anchored at the reminder's current time"""
+        rows = self.conn.execute("SELECT * FROM reminders WHERE repeat = 'Rule' AND rule NOT LIKE '%DTSTART%'")
+        updates = [(self._from_row(row).rule, row['id']) for row in rows]
+        self.conn.executemany("UPDATE reminders SET rule = ? WHERE id = ?", updates)
+        if updates:
+            log.info("Anchored %d recurrence rules", len(updates))
+
+    def migrate_dose_rollups(self):
+        """Build the daily rollups from dose events recorded before they existed"""
+        columns = ', '.join(DOSE_STATUSES)
+        counts = ', '.join(f"SUM(status = '{status}') AS {status}" for status in DOSE_STATUSES)
+        # With a single MAX() aggregate, the bare patient_id/name columns come from the latest event
+        cursor = self.conn.execute(f"""
+            INSERT INTO dose_daily (day, reminder_id, patient_id, name, {columns})
+            SELECT day, reminder_id, patient_id, name, {columns} FROM (
+                SELECT substr(scheduled, 1, 10) AS day, reminder_id, patient_id, name, {counts}, MAX(id)
+                FROM dose_events GROUP BY day, reminder_id
+            )
+        """)
+        if cursor.rowcount > 0:
+            log.info("Built %d daily dose rollups from existing events", cursor.rowcount)
+
+    def _to_row(self, reminder):
+        values = [getattr(reminder, col) for col in self.COLUMNS]
+        values[self.COLUMNS.index('time')] = reminder.time_str
+        # Fields without a column of their own are kept as JSON so the schema stays open
+        return values + [json.dumps(reminder.extra) if reminder.extra else None]
+
+    @staticmethod
+    def _from_row(row):
+        data = dict(row)
+        extra = data.pop('extra')
+        if extra:
+            data.update(json.loads(extra))
+        return Reminder.from_dict(data)
+
+    def _insert(self, reminder):
+        idx = uuid.uuid4().hex
+        placeholders = ', '.join('?' * (len(self.COLUMNS) + 2))
+        try:
+            with self.conn:
+                self.conn.execute(
+                    f"INSERT INTO reminders (id, {', '.join(self.COLUMNS)}, extra) VALUES ({placeholders})",
+                    [idx] + self._to_row(reminder)
+                )
+        except sqlite3.IntegrityError:
+            raise DuplicateReminderError(reminder.dedup_key) from None
+        return idx
+
+    def _insert_many(self, reminders):
+        placeholders = ', '.join('?' * (len(self.COLUMNS) + 2))
+        sql = f"INSERT INTO reminders (id, {', '.join(self.COLUMNS)}, extra) VALUES ({placeholders})"
+        results = []
+        # One transaction for the whole batch; a failing row does not abort the others
+        with self.conn:
+            for reminder in reminders:
+                idx = uuid.uuid4().hex
+                try:
+                    self.conn.execute(sql, [idx] + self._to_row(reminder))
+                    results.append((idx, None))
+                except sqlite3.IntegrityError:
+                    results.append((None, str(DuplicateReminderError(reminder.dedup_key))))
+                except sqlite3.Error as e:
+                    results.append((None, str(e)))
+        return results
+
+    def _iter_all(self, batch_size):
+        cursor = self.conn.execute("SELECT * FROM reminders")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield self._from_row(row)
+
+    def _changed_columns(self, changes):
+        """Columns to rewrite for ``changes``; any changed extra key rewrites the JSON column"""
+        columns = [col for col in self.COLUMNS if col in changes]
+        if 'patient_id' in changes:
+            columns.append('shard')
+        if any(key not in self.COLUMNS for key in changes):
+            columns.append('extra')
+        return tuple(columns)
+
+    def _column_values(self, reminder, columns):
+        row = dict(zip(self.COLUMNS + ('extra',), self._to_row(reminder)))
+        return [row[col] for col in columns]
+
+    def _update(self, idx, reminder, changes):
+        columns = self._changed_columns(changes)
+        assignments = ', '.join(f"{col} = ?" for col in columns)
+        try:
+            with self.conn:
+                self.conn.execute(f"UPDATE reminders SET {assignments} WHERE id = ?",
+                                  self._column_values(reminder, columns) + [idx])
+        except sqlite3.IntegrityError:
+            raise DuplicateReminderError(reminder.dedup_key) from None
+
+    def _update_many(self, updates, release):
+        # Reminders fired in one tick change the same fields, so this is usually one statement
+        groups = {}
+        for reminder, changes in updates:
+            groups.setdefault(self._changed_columns(changes), []).append(reminder)
+        with self.conn:
+            for columns, reminders in groups.items():
+                assignments = [f"{col} = ?" for col in columns]
+                if release:
+                    assignments.append("claimed_by = NULL, lease_until = NULL")
+                self.conn.executemany(f"UPDATE reminders SET {', '.join(assignments)} WHERE id = ?",
+                                      [self._column_values(reminder, columns) + [reminder.id]
+                                       for reminder in reminders])
+
+    def _delete(self, idx):
+        with self.conn:
+            self.conn.execute("DELETE FROM reminders WHERE id = ?", (idx,))
+
+    def _load_all(self):
+        return [self._from_row(row) for row in self.conn.execute("SELECT * FROM reminders")]
+
+    @staticmethod
+    def _lease_str(t):
+        return t.isoformat(sep=' ', timespec='microseconds')
+
+    def _claim_due(self, now, token, until, partition):
+        due = "enabled = 1 AND notified = 0 AND taken = 0 AND time <= ?"
+        params = [now.strftime(TIME_FORMAT)]
+        if partition:
+            due += " AND shard % ? = ?"
+            params += [partition[1], partition[0]]
+        now_str = self._lease_str(now)
+        # One UPDATE statement is atomic across every process sharing the file
+        with self.conn:
+            self.conn.execute(
+                f"UPDATE reminders SET claimed_by = ?, lease_until = ? "
+                f"WHERE {due} AND (lease_until IS NULL OR lease_until <= ?)",
+                [token, self._lease_str(until)] + params + [now_str]
+            )
+        rows = self.conn.execute("SELECT * FROM reminders WHERE claimed_by = ? ORDER BY time", (token,))
+        claimed = [self._from_row(row) for row in rows]
+        held = self.conn.execute(
+            f"SELECT MIN(lease_until) FROM reminders WHERE {due} AND lease_until > ? AND claimed_by <> ?",
+            params + [now_str, token]
+        ).fetchone()[0]
+        return claimed, datetime.fromisoformat(held) if held else None
+
+    def _insert_patient(self, patient):
+        idx = uuid.uuid4().hex
+        with self.conn:
+            self.conn.execute("INSERT INTO patients (id, name, email, phone) VALUES (?, ?, ?, ?)",
+                              (idx, patient['name'], patient.get('email'), patient.get('phone')))
+        return idx
+
+    def _load_patients(self):
+        return [dict(row) for row in self.conn.execute("SELECT * FROM patients")]
+
+    def _load_patient(self, idx):
+        row = self.conn.execute("SELECT * FROM patients WHERE id = ?", (idx,)).fetchone()
+        return dict(row) if row else None
+
+    EVENT_COLUMNS = ('reminder_id', 'patient_id', 'name', 'dosage', 'scheduled', 'status', 'recorded')
+
+    def _insert_events(self, events):
+        rows = []
+        for event in events:
+            row = [event.get(col) for col in self.EVENT_COLUMNS]
+            row[4] = event['scheduled'].strftime(TIME_FORMAT)
+            row[6] = event['recorded'].isoformat(timespec='seconds')
+            rows.append(row)
+        bucket_columns = ('day', 'reminder_id', 'patient_id', 'name') + DOSE_STATUSES
+        increments = ', '.join(f"{status} = {status} + excluded.{status}" for status in DOSE_STATUSES)
+        # The events and their rollup counts commit together
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO dose_events ({', '.join(self.EVENT_COLUMNS)}) VALUES ({', '.join('?' * len(self.EVENT_COLUMNS))})",
+                rows
+            )
+            self.conn.executemany(
+                f"INSERT INTO dose_daily ({', '.join(bucket_columns)}) VALUES ({', '.join('?' * len(bucket_columns))}) "
+                f"ON CONFLICT (day, reminder_id) DO UPDATE SET {increments}, "
+                f"patient_id = excluded.patient_id, name = excluded.name",
+                [[bucket[col] for col in bucket_columns] for bucket in daily_buckets(events)]
+            )
+
+    def _prune_events(self, cutoff):
+        with self.conn:
+            return self.conn.execute("DELETE FROM dose_events WHERE recorded < ?",
+                                     (cutoff.isoformat(timespec='seconds'),)).rowcount
+
+    def _aggregate_doses(self, keys, start, end, patient_id):
+        where, params = [], []
+        if start:
+            where.append("day >= ?")
+            params.append(start)
+        if end:
+            where.append("day <= ?")
+            params.append(end)
+        if patient_id is not ANY_PATIENT:
+            where.append("patient_id IS ?")
+            params.append(patient_id)
+        name = ", name, MAX(day) AS last_day" if 'reminder_id' in keys else ""
+        sql = (f"SELECT {', '.join(keys)}{name}, {', '.join(f'SUM({status}) AS {status}' for status in DOSE_STATUSES)} "
+               f"FROM dose_daily {'WHERE ' + ' AND '.join(where) if where else ''} "
+               f"GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}")
+        rows = []
+        for row in self.conn.execute(sql, params):
+            row = dict(row)
+            row.pop('last_day', None)
+            rows.append(row)
+        return rows
+
+    def close(self):
+        self.conn.close()
+
+class MemoryReminderDatabase(ReminderDatabase):
+    """Process-local backend with no persistence, for tests and benchmarks"""
+    def __init__(self, reminders=()):
+        super().__init__()
+        self._store = {}
+        self._patients = {}
+        self.dose_events = []
+        self.dose_daily = {}
+        self._leases = {}
+        for reminder in reminders:
+            self.add_reminder(reminder)
+
+    def _insert(self, reminder):
+        idx = uuid.uuid4().hex
+        self._store[idx] = reminder.replace(id=idx)
+        return idx
+
+    def _update(self, idx, reminder, changes):
+        if idx in self._store:
+            self._store[idx] = reminder.replace(id=idx)
+
+    def _update_many(self, updates, release):
+        for reminder, changes in updates:
+            self._update(reminder.id, reminder, changes)
+            if release:
+                self._leases.pop(reminder.id, None)
+
+    def _delete(self, idx):
+        self._store.pop(idx, None)
+        self._leases.pop(idx, None)
+
+    def _load_all(self):
+        return list(self._store.values())
+
+    def _due(self, now, partition):
+        due = [r for r in self._store.values()
+               if r.enabled and not r.notified and not r.taken and r.time <= now
+               and (not partition or r.shard % partition[1] == partition[0])]
+        return sorted(due, key=lambda r: r.time)
+
+    def _claim_due(self, now, token, until, partition):
+        claimed = []
+        held = None
+        for rem in self._due(now, partition):
+            lease = self._leases.get(rem.id)
+            if lease is not None and lease > now:
+                held = lease if held is None else min(held, lease)
+            else:
+                self._leases[rem.id] = until
+                claimed.append(rem)
+        return claimed, held
+
+    def _insert_patient(self, patient):
+        idx = uuid.uuid4().hex
+        self._patients[idx] = dict(patient, id=idx)
+        return idx
+
+    def _load_patients(self):
+        return [dict(patient) for patient in self._patients.values()]
+
+    def _load_patient(self, idx):
+        patient = self._patients.get(idx)
+        return dict(patient) if patient else None
+
+    def _insert_events(self, events):
+        self.dose_events.extend(dict(event) for event in events)
+        for bucket in daily_buckets(events):
+            key = (bucket['day'], bucket['reminder_id'])
+            stored = self.dose_daily.get(key)
+            if stored is None:
+                self.dose_daily[key] = bucket
+                continue
+            for status in DOSE_STATUSES:
+                stored[status] += bucket[status]
+            stored.update(patient_id=bucket['patient_id'], name=bucket['name'])
+
+    def _prune_events(self, cutoff):
+        kept = [event for event in self.dose_events if event['recorded'] >= cutoff]
+        pruned = len(self.dose_events) - len(kept)
+        self.dose_events = kept
+        return pruned
+
+    def _aggregate_doses(self, keys, start, end, patient_id):
+        groups = {}
+        for bucket in sorted(self.dose_daily.values(), key=lambda b: b['day']):
+            if (start and bucket['day'] < start) or (end and bucket['day'] > end) \
+                    or (patient_id is not ANY_PATIENT and bucket['patient_id'] != patient_id):
+                continue
+            group_key = tuple(bucket[key] for key in keys)
+            row = groups.get(group_key)
+            if row is None:
+                row = groups[group_key] = dict(zip(keys, group_key))
+                if 'reminder_id' in keys:
+                    row['name'] = None
+                row.update(dict.fromkeys(DOSE_STATUSES, 0))
+            if 'reminder_id' in keys:
+                row['name'] = bucket['name']
+            for status in DOSE_STATUSES:
+                row[status] += bucket[status]
+        return [groups[key] for key in sorted(groups)]
+
+def open_database(config=DB_CONFIG):
+    backend = config.get("backend", "mongo")
+    if backend == "mongo":
+        if not MONGO_AVAILABLE:
+            raise RuntimeError("pymongo is not installed; set DB_BACKEND=sqlite or install pymongo")
+        return MongoReminderDatabase(config["url"], config["db_name"],
+                                     watch_changes=config.get("watch_changes", False))
+    if backend == "sqlite":
+        return SQLiteReminderDatabase(config["sqlite_path"])
+    if backend == "memory":
+        return MemoryReminderDatabase()
+    raise ValueError(f"Unknown DB_BACKEND: {backend}")
+
+EXPORT_FIELDS = ('name', 'dosage', 'time', 'repeat', 'interval', 'rule', 'enabled', 'taken', 'notified', 'patient_id',
+                 'extra')
+
+def _file_format(path, fmt=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f"Cannot tell the format of {path}; use --format csv or jsonl")
+    return fmt
+
+def _read_rows(path, fmt):
+    """Yield (line number, row dict) pairs one at a time"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield line_no, json.loads(line)
+                    except ValueError as e:
+                        yield line_no, e
+
+def _parse_bool(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+def reminder_from_row(row, now=None):
+    """Build a Reminder from an import row with the add dialog's rules; returns (reminder, None) or (None, error).
+
+    'time' may be 'HH:MM' (next occurrence) or 'YYYY-MM-DD HH:MM'; 'extra' is an object, or its JSON text in CSV.
+    """
+    name = str(row.get('name') or '').strip()
+    dosage = str(row.get('dosage') or '').strip()
+    repeat = str(row.get('repeat') or 'Once').strip()
+    interval = row.get('interval') or 0
+    rule = str(row.get('rule') or '').strip() or None
+    time_value = str(row.get('time') or '').strip()
+    fire_time = None
+    hour = minute = None
+    try:
+        if len(time_value) > 5:
+            fire_time = datetime.strptime(time_value, TIME_FORMAT)
+            hour, minute = fire_time.hour, fire_time.minute
+        else:
+            hour, minute = (int(part) for part in time_value.split(':'))
+    except ValueError:
+        pass
+    error = validate_reminder_fields(name, dosage, hour, minute, repeat, interval, rule)
+    if error:
+        return None, error
+    # JSONL may carry numeric ids; anything else that is not text is rejected
+    patient_id = row.get('patient_id')
+    if isinstance(patient_id, bool) or not isinstance(patient_id, (str, int, type(None))):
+        return None, "patient_id must be a string."
+    patient_id = str(patient_id).strip() if patient_id not in (None, '') else None
+    extra = row.get('extra') or {}
+    if isinstance(extra, str):
+        try:
+            extra = json.loads(extra)
+        except ValueError:
+            return None, "extra must be a JSON object."
+    if not isinstance(extra, dict):
+        return None, "extra must be a JSON object."
+    recurrence = None
+    if repeat == 'Rule':
+        recurrence = Recurrence.parse(rule)
+        if recurrence.dtstart is None:
+            start = fire_time or (now or datetime.now()).replace(hour=hour, minute=minute, second=0, microsecond=0)
+            recurrence = recurrence.anchored(start)
+    return Reminder(
+        name=name,
+        dosage=dosage,
+        time=fire_time or next_fire_time(hour, minute, now, recurrence),
+        repeat=repeat,
+        interval=int(interval) if repeat == 'Custom' else 0,
+        rule=str(recurrence) if recurrence else None,
+        enabled=_parse_bool(row.get('enabled'), True),
+        taken=_parse_bool(row.get('taken'), False),
+        notified=_parse_bool(row.get('notified'), False),
+        patient_id=patient_id or None,
+        extra=extra
+    ), None
+
+def import_reminders(db, path, fmt=None, chunk_size=500, report=None):
+    """Stream reminders from a CSV/JSONL file into ``db`` in chunks; returns (imported, failed) counts"""
+    fmt = _file_format(path, fmt)
+    report = report or (lambda line_no, message: log.warning("Line %d: %s", line_no, message))
+    imported = failed = 0
+    chunk = []
+    
+    def flush():
+        nonlocal imported, failed
+        results = db.add_reminders([reminder for _, reminder in chunk])
+        for (line_no, _), (idx, error) in zip(chunk, results):
+            if error:
+                failed += 1
+                report(line_no, error)
+            else:
+                imported += 1
+        chunk.clear()
+    
+    for line_no, row in _read_rows(path, fmt):
+        if isinstance(row, Exception) or not isinstance(row, dict):
+            failed += 1
+            report(line_no, f"Not a JSON object: {row}")
+            continue
+        reminder, error = reminder_from_row(row)
+        if error:
+            failed += 1
+            report(line_no, error)
+            continue
+        chunk.append((line_no, reminder))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return imported, failed
+
+def export_reminders(db, path, fmt=None):
+    """Stream every reminder from the backend to a CSV/JSONL file; returns the row count"""
+    fmt = _file_format(path, fmt)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = None
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=('id',) + EXPORT_FIELDS)
+            writer.writeheader()
+        for reminder in db.iter_reminders():
+            row = {'id': reminder.id}
+            row.update({key: getattr(reminder, key) for key in EXPORT_FIELDS})
+            row['time'] = reminder.time_str
+            row['extra'] = reminder.extra or None
+            if writer:
+                row['extra'] = json.dumps(reminder.extra) if reminder.extra else ''
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row) + '\n')
+            count += 1
+    return count
+
+class ReminderScheduler:
+    """A min-heap of upcoming fire times; ``run()`` sleeps until the earliest and awaits ``on_due(reminder_ids)``"""
+    # Entry id for a wake-up that is not tied to one reminder
+    WAKE = '__wake__'
+    # After a failed tick (e.g. the database was unreachable), look again this much later
+    RETRY_DELAY = timedelta(seconds=30)
+    
+    def __init__(self, on_due):
+        self.on_due = on_due
+        self.running = False
+        self._heap = []
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+
+    def _notify(self):
+        # Caller holds self._lock
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass  # the loop has already been closed
+
+    @staticmethod
+    def is_pending(reminder):
+        return reminder.enabled and not reminder.notified and not reminder.taken
+
+    def load(self, reminders):
+        with self._lock:
+            self._entries = {}
+            for rem in reminders:
+                if self.is_pending(rem):
+                    self._entries[rem.id] = rem.time
+            self._heap = [(t, rid) for rid, t in self._entries.items()]
+            heapq.heapify(self._heap)
+            self._notify()
+
+    def schedule(self, reminder):
+        if not self.is_pending(reminder):
+            self.remove(reminder.id)
+            return
+        fire_time = reminder.time
+        with self._lock:
+            if self._entries.get(reminder.id) == fire_time:
+                return
+            self._entries[reminder.id] = fire_time
+            heapq.heappush(self._heap, (fire_time, reminder.id))
+            # Only wake the loop if this entry is the new earliest deadline
+            if self._heap[0] == (fire_time, reminder.id):
+                self._notify()
+
+    def wake_at(self, when):
+        """Run an extra tick at ``when`` (keeps only the earliest pending request)"""
+        with self._lock:
+            pending = self._entries.get(self.WAKE)
+            if pending is not None and pending <= when:
+                return
+            self._entries[self.WAKE] = when
+            heapq.heappush(self._heap, (when, self.WAKE))
+            if self._heap[0] == (when, self.WAKE):
+                self._notify()
+    
+    def remove(self, reminder_id):
+        with self._lock:
+            if self._entries.pop(reminder_id, None) is not None:
+                self._notify()
+
+    def next_deadline(self):
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap and self._entries.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
 
-class ReminderDatabase:
-    def __init__(self, db_url='mongodb://localhost:27017/', db_name='reminder_db', collection_name='reminders'):
-        self.client = MongoClient(db_url)
-        self.db = self.client[db_name]
-        self.collection = self.db[collection_name]
+    def _pop_due(self, now):
+        due = []
+        while self._heap:
+            fire_time, rid = self._heap[0]
+            if self._entries.get(rid) != fire_time:
+                heapq.heappop(self._heap)
+                continue
+            if fire_time > now:
+                break
+            heapq.heappop(self._heap)
+            del self._entries[rid]
+            due.append(rid)
+        return due
 
-    def add_reminder(self, reminder):
-        reminder['notified'] = bool(reminder['notified'])
-        reminder['taken'] = bool(reminder['taken'])
-        reminder['enabled'] = bool(reminder.get('enabled', True))
-        self.collection.insert_one(reminder)
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.running = True
+        while self.running:
+            # Cleared before looking at the heap, so a change made after the look still wakes us
+            self._wakeup.clear()
+            with self._lock:
+                self._drop_stale()
+                delay = (self._heap[0][0] - datetime.now()).total_seconds() if self._heap else None
+                due = self._pop_due(datetime.now()) if delay is not None and delay <= 0 else []
+            if due:
+                try:
+                    await self.on_due(due)
+                except Exception as e:
+                    # The popped reminders are still due in the database; the retry tick claims them
+                    log.exception("Scheduler error: %s", e)
+                    self.wake_at(datetime.now() + self.RETRY_DELAY)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
 
-    def update_reminder(self, idx, reminder):
-        reminder['notified'] = bool(reminder['notified'])
-        reminder['taken'] = bool(reminder['taken'])
-        reminder['enabled'] = bool(reminder.get('enabled', True))
-        self.collection.update_one(
-            {'_id': ObjectId(idx)},
-            {'$set': reminder}
-        )
+    def stop(self):
+        with self._lock:
+            self.running = False
+            self._notify()
 
-    def delete_reminder(self, idx):
-        self.collection.delete_one({'_id': ObjectId(idx)})
+class ReminderStats:
+    """Incrementally maintained counters for the "Today's Overview" panel"""
+    def __init__(self):
+        self._all = []
+        self._taken = []
+        self._open = []
+        self._index = {}
+        self._lock = threading.Lock()
 
-    def get_reminders(self):
-        result = []
-        for doc in self.collection.find():
-            reminder = doc.copy()
-            reminder['id'] = str(doc['_id'])
-            del reminder['_id']
-            result.append(reminder)
-        return result
+    def load(self, reminders):
+        with self._lock:
+            self._index = {}
+            for rem in reminders:
+                self._index[rem.id] = (rem.time, rem.taken)
+            self._all = sorted(t for t, _ in self._index.values())
+            self._taken = sorted(t for t, taken in self._index.values() if taken)
+            self._open = sorted(t for t, taken in self._index.values() if not taken)
 
-    def get_reminder_by_id(self, idx):
-        doc = self.collection.find_one({'_id': ObjectId(idx)})
-        if doc:
-            reminder = doc.copy()
-            reminder['id'] = str(doc['_id'])
-            del reminder['_id']
-            return reminder
-        return None
+    @staticmethod
+    def _discard(times, t):
+        i = bisect.bisect_left(times, t)
+        if i < len(times) and times[i] == t:
+            del times[i]
 
-    def close(self):
-        self.client.close()
+    def _remove_locked(self, reminder_id):
+        entry = self._index.pop(reminder_id, None)
+        if entry:
+            t, taken = entry
+            self._discard(self._all, t)
+            self._discard(self._taken if taken else self._open, t)
+
+    def update(self, reminder):
+        entry = (reminder.time, reminder.taken)
+        with self._lock:
+            if self._index.get(reminder.id) == entry:
+                return
+            self._remove_locked(reminder.id)
+            self._index[reminder.id] = entry
+            t, taken = entry
+            bisect.insort(self._all, t)
+            bisect.insort(self._taken if taken else self._open, t)
+
+    def remove(self, reminder_id):
+        with self._lock:
+            self._remove_locked(reminder_id)
+
+    @staticmethod
+    def _count_between(times, start, end):
+        return bisect.bisect_left(times, end) - bisect.bisect_left(times, start)
+
+    def snapshot(self, now):
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=1)
+        with self._lock:
+            return {
+                'total': len(self._index),
+                'today': self._count_between(self._all, start, end),
+                'taken_today': self._count_between(self._taken, start, end),
+                'overdue': bisect.bisect_left(self._open, now)
+            }
+
+    def next_change(self, now):
+        """When the snapshot next changes on its own: midnight, or the next reminder turning overdue"""
+        wake = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        with self._lock:
+            i = bisect.bisect_right(self._open, now)
+            if i < len(self._open):
+                wake = min(wake, self._open[i] + timedelta(seconds=1))
+        return wake
+
+class ReminderEngine:
+    """Scheduling, notification and recurrence, shared by the Tk app and the headless daemon.
+
+    ``post`` runs the ``on_fired``/``on_delivery``/``on_change`` callbacks on the client's thread.
+    """
+    # Seconds before a patient's contacts (or an unknown patient id) are looked up again
+    PATIENT_TTL = 300
+    
+    def __init__(self, db, desktop=True, auto_advance=False, post=None, partitions=1):
+        self.db = db
+        self.desktop = desktop
+        self.auto_advance = auto_advance
+        self.post = post or (lambda fn: fn())
+        self.on_fired = None
+        self.on_delivery = None
+        self.on_change = None
+        
+        self.partitions = max(1, partitions)
+        # One database thread per partition, so partitions claim in parallel where the backend allows it
+        self.loop = EngineLoop(io_workers=NOTIFY_CONFIG["workers"], db_workers=self.partitions)
+        channels = {"email": send_email}
+        if desktop:
+            channels.update(sound=play_sound, tray=show_tray_notification)
+        self.notifier = NotificationDispatcher(
+            channels,
+            workers=NOTIFY_CONFIG["workers"],
+            channel_limits=NOTIFY_CONFIG["channel_limits"],
+            post=self.post,
+            loop=self.loop
+        )
+        self.alerts = AlertCoalescer(NOTIFY_CONFIG["coalesce_ms"] / 1000, self.alert, self.loop)
+        self.schedulers = [
+            ReminderScheduler(lambda reminder_ids, index=index: self.tick(reminder_ids, index))
+            for index in range(self.partitions)
+        ]
+        self._tasks = []
+        self._patients = {}
+        self._patient_expires = {}
+        self.exporter = MetricsExporter(metrics, **METRICS_CONFIG)
+        # Identifies this process in claim leases shared with other instances
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._next_prune = None
+    
+    def scheduler_for(self, reminder):
+        return self.schedulers[reminder.shard % self.partitions]
+    
+    def load(self, reminders):
+        buckets = [[] for _ in self.schedulers]
+        for reminder in reminders:
+            buckets[reminder.shard % self.partitions].append(reminder)
+        for scheduler, bucket in zip(self.schedulers, buckets):
+            scheduler.load(bucket)
+    
+    def next_deadline(self):
+        deadlines = [d for d in (scheduler.next_deadline() for scheduler in self.schedulers) if d]
+        return min(deadlines) if deadlines else None
+    
+    def start(self):
+        self.catch_up()
+        self.prune_history()
+        self.load(self.db.get_reminders())
+        self._patients = {patient['id']: patient for patient in self.db.get_patients()}
+        expires = time.monotonic() + self.PATIENT_TTL
+        self._patient_expires = dict.fromkeys(self._patients, expires)
+        self.db.on_change = self._on_external_change
+        self.loop.start()
+        if self.desktop and SOUND_ENABLED:
+            # Open the mixer and decode the alarm now rather than when the first reminder fires
+            self.loop.submit(self.loop.run_io(self._preload_audio))
+        if not self.db.follows_changes:
+            first_sweep = datetime.now() + timedelta(seconds=SCHEDULER_CONFIG["sweep_seconds"])
+            for scheduler in self.schedulers:
+                scheduler.wake_at(first_sweep)
+        self._tasks = [self.loop.submit(scheduler.run()) for scheduler in self.schedulers]
+        self.exporter.start()
+        log.info("Reminder engine started", extra={"next_deadline": str(self.next_deadline()),
+                                                   "partitions": self.partitions,
+                                                   "patients": len(self._patients)})
+    
+    def stop(self, timeout=5, close_db=True):
+        """Stop scheduling, let notifications drain for up to ``timeout`` seconds, then close; ``close_db=False`` keeps the database open"""
+        for scheduler in self.schedulers:
+            scheduler.stop()
+        for task in self._tasks:
+            with contextlib.suppress(concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+                task.result(timeout)
+        # Alert anything still waiting in the coalescing window before the channels go
+        with contextlib.suppress(concurrent.futures.TimeoutError):
+            self.loop.call(self.alerts.flush, timeout=timeout)
+        self.notifier.stop(timeout)
+        self.loop.stop(timeout)
+        self.exporter.stop()
+        stop_call_queue()
+        smtp_pool.close()
+        if self.desktop and SOUND_ENABLED:
+            audio.close()
+        if close_db:
+            self.db.close()
+        log.info("Reminder engine stopped")
+    
+    def _preload_audio(self):
+        try:
+            audio.start()
+        except Exception as e:
+            log.error("Sound error: %s", e)
+    
+    def _on_external_change(self, reminder_id, reminder):
+        # Runs on the change stream thread
+        if reminder is None:
+            self.reminder_removed(reminder_id)
+        else:
+            self.reminder_changed(reminder)
+        if self.on_change:
+            self.on_change(reminder_id, reminder)
+    
+    def reminder_changed(self, reminder):
+        # A reminder moved to another patient may have left its old partition
+        for scheduler in self.schedulers:
+            if scheduler is not self.scheduler_for(reminder):
+                scheduler.remove(reminder.id)
+        self.scheduler_for(reminder).schedule(reminder)
+    
+    def reminder_removed(self, reminder_id):
+        for scheduler in self.schedulers:
+            scheduler.remove(reminder_id)
+    
+    def get_patient(self, patient_id):
+        """Contact details for a patient; None (or an unknown id) means the configured default"""
+        if patient_id is None:
+            return None
+        if time.monotonic() < self._patient_expires.get(patient_id, 0):
+            return self._patients.get(patient_id)
+        # Re-read after the TTL so a long-running daemon picks up edited contacts;
+        # unknown ids are cached as None and fall back to the default contacts
+        patient = self.db.get_patient(patient_id)
+        self._patients[patient_id] = patient
+        self._patient_expires[patient_id] = time.monotonic() + self.PATIENT_TTL
+        return patient
+    
+    @staticmethod
+    def next_occurrence(reminder):
+        """The reminder moved to its next occurrence and reset; unchanged for 'Once' or a finished series"""
+        recurrence = reminder.recurrence
+        next_time = recurrence and recurrence.next_after(reminder.time, reminder.time)
+        if next_time is None:
+            return reminder
+        return reminder.replace(time=next_time, notified=False, taken=False)
+    
+    def catch_up(self, now=None):
+        """Move recurring reminders left behind by downtime to their current occurrence; returns how many moved"""
+        now = now or datetime.now()
+        cutoff = now - timedelta(minutes=SCHEDULER_CONFIG["catch_up_grace"])
+        updates = []
+        events = []
+        for rem in self.db.get_reminders():
+            recurrence = rem.recurrence
+            if recurrence is None or not rem.enabled or rem.time >= cutoff:
+                continue
+            if rem.notified and recurrence.next_after(rem.time, rem.time) is None:
+                # A finished series already caught up (or fired) on an earlier run
+                continue
+            # A taken dose that was never advanced was not missed
+            missed = [] if rem.taken else [rem.time]
+            missed.extend(recurrence.between(rem.time, rem.time, cutoff))
+            events.extend(dose_event(rem, 'missed', now, scheduled) for scheduled in missed)
+            next_time = recurrence.next_after(rem.time, cutoff - timedelta(microseconds=1))
+            if next_time is None:
+                # The series has ended; park it on its last occurrence so later runs skip it
+                last = missed[-1] if missed else rem.time
+                updates.append(rem.replace(time=last, notified=True, taken=rem.taken and last == rem.time))
+            else:
+                updates.append(rem.replace(time=next_time, notified=False, taken=False))
+        if updates:
+            with self.db.batch() as batch:
+                for updated in updates:
+                    batch.update(updated)
+                batch.add_events(events)
+            log.info("Caught up overdue recurring reminders", extra={"reminders": len(updates),
+                                                                    "missed": len(events)})
+        return len(updates)
+    
+    def prune_history(self, now=None):
+        """Expire old raw dose events; runs at start and then at most once a day from the scheduler"""
+        now = now or datetime.now()
+        self._next_prune = now + timedelta(days=1)
+        pruned = self.db.prune_dose_events(now)
+        if pruned:
+            log.info("Pruned old dose events", extra={"events": pruned})
+    
+    async def tick(self, reminder_ids, partition):
+        # The claim and the notified/advance write block, so they run on the database thread
+        await self.loop.run_db(self.check_reminders, reminder_ids, partition)
+    
+    def check_reminders(self, reminder_ids, partition=0):
+        """Claim and fire a partition's due reminders; run on the database thread by ``tick``"""
+        with metrics.timer("tick_seconds", partition=partition):
+            self._check_due(partition)
+        if self._next_prune and datetime.now() >= self._next_prune:
+            self.prune_history()
+    
+    def _check_due(self, partition):
+        now = datetime.now()
+        lease = timedelta(seconds=SCHEDULER_CONFIG["lease_seconds"])
+        due, held_until = self.db.claim_due(now, self.owner, lease, (partition, self.partitions))
+        if held_until:
+            # Look again when another instance's lease runs out, in case it died
+            self.schedulers[partition].wake_at(held_until)
+        if not self.db.follows_changes:
+            # Reminders other processes add or advance never reach this heap, so claim on a timer as well
+            self.schedulers[partition].wake_at(now + timedelta(seconds=SCHEDULER_CONFIG["sweep_seconds"]))
+        if not due:
+            return
+        # Resolve contacts here on the database thread; notify() runs on the loop and only reads the cache
+        for patient_id in {rem.patient_id for rem in due}:
+            self.get_patient(patient_id)
+        fired_all = []
+        # Mark notified (or advanced) and release the leases in one write
+        with self.db.batch(release=True) as batch:
+            batch.add_events([dose_event(rem, 'fired', now) for rem in due])
+            for rem in due:
+                metrics.observe("fire_lag_seconds", (now - rem.time).total_seconds())
+                fired = rem.replace(notified=True)
+                if self.auto_advance and rem.recurrence is not None:
+                    fired = self.next_occurrence(fired)
+                batch.update(fired)
+                fired_all.append(fired)
+        for fired in fired_all:
+            self.reminder_changed(fired)
+        log.info("Reminders due", extra={"count": len(due), "partition": partition,
+                                         "reminder_ids": [rem.id for rem in due]})
+        self.alerts.add(due)
+    
+    def alert(self, due):
+        """Notify one coalesced batch and hand it to the client as a single on_fired call"""
+        self.notify(due)
+        if self.on_fired:
+            self.post(lambda: self.on_fired(due))
+    
+    def _delivered(self, channel, reminders):
+        # The call queue reports from its own thread, so always hop through post
+        def callback(result):
+            if self.on_delivery:
+                self.post(lambda: self.on_delivery(channel, reminders, result))
+        return callback
+    
+    @staticmethod
+    def reminder_message(rem):
+        return f"Time to take your medicine:\n\nName: {rem.name}\nDosage: {rem.dosage}\nTime: {rem.time:%H:%M}"
+    
+    def notify(self, due):
+        """Alert a batch: one sound and tray message, then per patient one email (digest) and one call"""
+        if self.desktop:
+            # The first custom alarm in the batch wins; the others would only cut each other off
+            sounds = [rem.extra['sound'] for rem in due if rem.extra.get('sound')]
+            self.notifier.submit("sound", sounds[0] if sounds else None)
+            if len(due) > 1:
+                self.notifier.submit("tray", *format_digest(due))
+            else:
+                self.notifier.submit("tray", "Medicine Reminder", self.reminder_message(due[0]))
+        by_patient = {}
+        for rem in due:
+            by_patient.setdefault(rem.patient_id, []).append(rem)
+        for patient_id, reminders in by_patient.items():
+            patient = self._patients.get(patient_id) or {}
+            digest = EMAIL_CONFIG["digest"] and len(reminders) > 1
+            if digest:
+                self.notifier.submit("email", *format_digest(reminders), patient.get('email'),
+                                     callback=self._delivered("email", reminders))
+            else:
+                for rem in reminders:
+                    self.notifier.submit("email", "Medicine Reminder", self.reminder_message(rem), patient.get('email'),
+                                         callback=self._delivered("email", [rem]))
+            # One call per patient reads out every medicine due in this tick
+            make_call([f"{rem.name}, dosage {rem.dosage}" for rem in reminders],
+                      callback=self._delivered("call", reminders), to_number=patient.get('phone'))
+    
+    def mark_taken(self, reminder, advance=True):
+        """Mark a dose taken and log it; recurring reminders move on to their next occurrence"""
+        return self.mark_all_taken([reminder], advance)[0]
+    
+    def mark_all_taken(self, reminders, advance=True):
+        """mark_taken for several reminders in one write; returns the updated reminders"""
+        now = datetime.now()
+        updated_all = []
+        with self.db.batch() as batch:
+            batch.add_events([dose_event(rem, 'taken', now) for rem in reminders])
+            for rem in reminders:
+                updated = rem.replace(taken=True)
+                if advance:
+                    updated = self.next_occurrence(updated)
+                batch.update(updated)
+                updated_all.append(updated)
+        for updated in updated_all:
+            self.reminder_changed(updated)
+        return updated_all
+    
+    def snooze(self, reminder, minutes):
+        updated = reminder.replace(time=reminder.time + timedelta(minutes=minutes), notified=False)
+        with self.db.batch() as batch:
+            batch.update(updated)
+            batch.add_events([dose_event(reminder, 'snoozed', datetime.now())])
+        self.reminder_changed(updated)
+        return updated
 
 class ModernReminderDialog:
     def __init__(self, parent, reminder=None):
@@ -230,10 +2924,9 @@ class ModernReminderDialog:
                 bg='#f8f9fa', fg='#34495e').pack(anchor='w')
         
         self.repeat_var = tk.StringVar(value='Once')
-        repeat_options = ['Once', 'Daily', 'Weekly', 'Custom']
         
         repeat_combo = ttk.Combobox(repeat_frame, textvariable=self.repeat_var, 
-                                   values=repeat_options, state='readonly', 
+                                   values=REPEAT_OPTIONS, state='readonly', 
                                    font=('Segoe UI', 11), width=30)
         repeat_combo.pack(fill='x', pady=(5, 0))
         repeat_combo.bind("<<ComboboxSelected>>", self.on_repeat_change)
@@ -242,9 +2935,15 @@ class ModernReminderDialog:
         self.custom_frame = tk.Frame(main_frame, bg='#f8f9fa')
         self.create_input_field(self.custom_frame, "Custom Interval (days)", "e.g., 3", 'custom_interval_var')
         
+        # Recurrence rule (initially hidden)
+        self.rule_frame = tk.Frame(main_frame, bg='#f8f9fa')
+        self.create_input_field(self.rule_frame, "Rule (RRULE, starts at the time above)",
+                                "e.g., FREQ=WEEKLY;BYDAY=MO,WE,FR", 'rule_var')
+        
         # Buttons
         button_frame = tk.Frame(main_frame, bg='#f8f9fa')
         button_frame.pack(fill='x', pady=(20, 0))
+        self.button_frame = button_frame
         
         # Cancel button
         cancel_btn = tk.Button(button_frame, text="Cancel", font=('Segoe UI', 10),
@@ -292,59 +2991,49 @@ class ModernReminderDialog:
         entry.bind('<FocusOut>', on_focus_out)
     
     def on_repeat_change(self, event):
-        if self.repeat_var.get() == 'Custom':
-            self.custom_frame.pack(fill='x', pady=(0, 15))
-        else:
-            self.custom_frame.pack_forget()
+        for value, frame in (('Custom', self.custom_frame), ('Rule', self.rule_frame)):
+            if self.repeat_var.get() == value:
+                frame.pack(fill='x', pady=(0, 15), before=self.button_frame)
+            else:
+                frame.pack_forget()
     
     def populate_fields(self):
         if self.reminder:
             # Remove placeholder text and populate with actual values
-            self.name_var.set(self.reminder['name'])
-            self.dosage_var.set(self.reminder['dosage'])
+            self.name_var.set(self.reminder.name)
+            self.dosage_var.set(self.reminder.dosage)
             
-            # Parse time
-            time_str = self.reminder['time'][-5:]  # Get HH:MM
-            hour, minute = time_str.split(':')
-            self.hour_var.set(hour)
-            self.minute_var.set(minute)
+            self.hour_var.set(f"{self.reminder.time.hour:02d}")
+            self.minute_var.set(f"{self.reminder.time.minute:02d}")
             
-            self.repeat_var.set(self.reminder['repeat'])
-            if self.reminder['repeat'] == 'Custom':
-                self.custom_interval_var.set(str(self.reminder['interval']))
-                self.on_repeat_change(None)
+            self.repeat_var.set(self.reminder.repeat)
+            if self.reminder.repeat == 'Custom':
+                self.custom_interval_var.set(str(self.reminder.interval))
+            if self.reminder.repeat == 'Rule':
+                # The series restarts from the time in the dialog when saved
+                self.rule_var.set(str(self.reminder.recurrence.anchored(None)))
+            self.on_repeat_change(None)
     
     def validate_input(self):
         name = self.name_var.get().strip()
         dosage = self.dosage_var.get().strip()
         
-        # Check if fields are empty or contain placeholder text
-        if not name or name in ['e.g., Aspirin']:
-            messagebox.showerror("Error", "Please enter a medicine name.")
-            return False
+        # Placeholder text counts as empty
+        if name in ['e.g., Aspirin']:
+            name = ''
+        if dosage in ['e.g., 2 tablets, 5ml']:
+            dosage = ''
         
-        if not dosage or dosage in ['e.g., 2 tablets, 5ml']:
-            messagebox.showerror("Error", "Please enter the dosage.")
-            return False
+        rule = self.rule_var.get().strip()
+        if rule in ['e.g., FREQ=WEEKLY;BYDAY=MO,WE,FR']:
+            rule = ''
         
-        try:
-            hour = int(self.hour_var.get())
-            minute = int(self.minute_var.get())
-            if not (0 <= hour <= 23 and 0 <= minute <= 59):
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("Error", "Please enter valid time.")
+        error = validate_reminder_fields(name, dosage, self.hour_var.get(), self.minute_var.get(),
+                                         self.repeat_var.get(), self.custom_interval_var.get(), rule)
+        if error:
+            messagebox.showerror("Error", error)
             return False
         
-        if self.repeat_var.get() == 'Custom':
-            try:
-                interval = int(self.custom_interval_var.get())
-                if interval < 1:
-                    raise ValueError
-            except ValueError:
-                messagebox.showerror("Error", "Please enter a valid custom interval (positive number).")
-                return False
-        
         return True
     
     def save(self):
@@ -366,33 +3055,414 @@ class ModernReminderDialog:
         repeat = self.repeat_var.get()
         interval = 0
         
+        recurrence = None
+        
         if repeat == 'Custom':
             interval = int(self.custom_interval_var.get())
+        if repeat == 'Rule':
+            start = datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
+            recurrence = Recurrence.parse(self.rule_var.get().strip()).anchored(start)
         
         # Create scheduled time
-        now = datetime.now()
-        scheduled_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        if scheduled_time < now:
-            scheduled_time += timedelta(days=1)
-        
-        self.result = {
-            'name': name,
-            'dosage': dosage,
-            'time': scheduled_time.strftime('%Y-%m-%d %H:%M'),
-            'repeat': repeat,
-            'interval': interval,
-            'notified': False,
-            'taken': False,
-            'enabled': True
-        }
+        scheduled_time = next_fire_time(hour, minute, recurrence=recurrence)
+        
+        self.result = Reminder(
+            name=name,
+            dosage=dosage,
+            time=scheduled_time,
+            repeat=repeat,
+            interval=interval,
+            rule=str(recurrence) if recurrence else None,
+            # Keep fields the dialog does not edit: the patient and e.g. a custom sound
+            patient_id=self.reminder.patient_id if self.reminder else None,
+            extra=self.reminder.extra if self.reminder else None
+        )
         
         self.dialog.destroy()
     
     def cancel(self):
         self.dialog.destroy()
 
+def reminder_status(reminder, now):
+    """Return the card colours and labels for a reminder at time ``now``"""
+    rem_time = reminder.time
+    is_today = rem_time.date() == now.date()
+    is_overdue = rem_time < now and not reminder.taken
+    
+    # Color scheme based on status
+    if reminder.taken:
+        bg_color, border_color = '#d5f4e6', '#27ae60'
+        status_text, status_color = "✅ Taken", '#27ae60'
+    elif is_overdue:
+        bg_color, border_color = '#ffeaa7', '#fdcb6e'
+        status_text, status_color = "⚠️ Overdue", '#e17055'
+    elif is_today and rem_time.hour <= now.hour + 1:
+        bg_color, border_color = '#74b9ff', '#0984e3'
+        status_text, status_color = "🔔 Soon", '#0984e3'
+    else:
+        bg_color, border_color = '#f8f9fa', '#e9ecef'
+        status_text, status_color = "📅 Scheduled", '#6c757d'
+    
+    time_str = rem_time.strftime('%I:%M %p')
+    if is_today:
+        time_text = f"Today at {time_str}"
+    elif rem_time.date() == (now + timedelta(days=1)).date():
+        time_text = f"Tomorrow at {time_str}"
+    else:
+        time_text = rem_time.strftime('%b %d at %I:%M %p')
+    
+    return bg_color, border_color, status_text, status_color, time_text
+
+class ReminderCard:
+    """One reusable row of the reminder list; ``bind`` re-points it at another reminder"""
+    def __init__(self, parent_list):
+        self.list = parent_list
+        self.app = parent_list.app
+        self.reminder_id = None
+        self.signature = None
+        self.bg_color = '#f8f9fa'
+        
+        canvas = parent_list.canvas
+        self.frame = tk.Frame(canvas, relief='solid', borderwidth=2, bd=2,
+                              height=VirtualReminderList.ROW_HEIGHT - 10)
+        self.frame.pack_propagate(False)
+        self.item = canvas.create_window(0, 0, window=self.frame, anchor='nw', state='hidden')
+        
+        content_frame = tk.Frame(self.frame, padx=15, pady=12)
+        content_frame.pack(fill='x')
+        
+        # Top row - Medicine name and status
+        top_row = tk.Frame(content_frame)
+        top_row.pack(fill='x', pady=(0, 8))
+        self.name_label = tk.Label(top_row, font=('Segoe UI', 14, 'bold'), fg='#2c3e50')
+        self.name_label.pack(side='left', anchor='w')
+        self.status_label = tk.Label(top_row, font=('Segoe UI', 10, 'bold'))
+        self.status_label.pack(side='right', anchor='e')
+        
+        # Middle row - Dosage and time
+        middle_row = tk.Frame(content_frame)
+        middle_row.pack(fill='x', pady=(0, 8))
+        self.dosage_label = tk.Label(middle_row, font=('Segoe UI', 11), fg='#34495e')
+        self.dosage_label.pack(side='left', anchor='w')
+        self.time_label = tk.Label(middle_row, font=('Segoe UI', 11), fg='#34495e')
+        self.time_label.pack(side='right', anchor='e')
+        
+        # Repeat info (blank for one-off reminders so every row has the same height)
+        self.repeat_label = tk.Label(content_frame, font=('Segoe UI', 9), fg='#7f8c8d')
+        self.repeat_label.pack(anchor='w', pady=(0, 8))
+        
+        # Action buttons
+        button_frame = tk.Frame(content_frame)
+        button_frame.pack(fill='x')
+        self.toggle_btn = tk.Button(button_frame, font=('Segoe UI', 9), fg='white', relief='flat',
+                                    padx=12, pady=4, command=lambda: self.app.toggle_reminder(self.reminder_id))
+        self.toggle_btn.pack(side='left', padx=(0, 5))
+        self.take_btn = tk.Button(button_frame, text="✅ Take", font=('Segoe UI', 9),
+                                  bg='#27ae60', fg='white', relief='flat', padx=12, pady=4,
+                                  command=lambda: self.app.mark_as_taken(self.reminder_id))
+        self.snooze_btn = tk.Button(button_frame, text="😴 Snooze", font=('Segoe UI', 9),
+                                    bg='#f39c12', fg='white', relief='flat', padx=12, pady=4,
+                                    command=lambda: self.app.snooze_reminder(self.reminder_id))
+        edit_btn = tk.Button(button_frame, text="✏️ Edit", font=('Segoe UI', 9),
+                             bg='#3498db', fg='white', relief='flat', padx=12, pady=4,
+                             command=lambda: self.app.edit_reminder(self.reminder_id))
+        edit_btn.pack(side='right', padx=(5, 0))
+        delete_btn = tk.Button(button_frame, text="🗑️ Delete", font=('Segoe UI', 9),
+                               bg='#e74c3c', fg='white', relief='flat', padx=12, pady=4,
+                               command=lambda: self.app.delete_reminder(self.reminder_id))
+        delete_btn.pack(side='right', padx=(5, 0))
+        
+        self.bg_widgets = [self.frame, content_frame, top_row, middle_row, button_frame, self.name_label,
+                           self.status_label, self.dosage_label, self.time_label, self.repeat_label]
+        
+        # Hover effect
+        self.frame.bind("<Enter>", lambda e: self.frame.configure(bg=self.app.darken_color(self.bg_color)))
+        self.frame.bind("<Leave>", lambda e: self.frame.configure(bg=self.bg_color))
+        for widget in self.bg_widgets:
+            widget.bind("<MouseWheel>", parent_list.on_mousewheel)
+    
+    def bind(self, reminder, now):
+        bg_color, border_color, status_text, status_color, time_text = reminder_status(reminder, now)
+        enabled = reminder.enabled
+        if reminder.repeat == 'Rule':
+            repeat_text = f"🔄 Repeats {reminder.recurrence.describe()}"
+        else:
+            repeat_text = f"🔄 Repeats {reminder.repeat.lower()}" if reminder.repeat != 'Once' else ""
+        signature = (reminder.id, reminder.name, reminder.dosage, repeat_text, enabled,
+                     reminder.taken, bg_color, status_text, time_text)
+        self.reminder_id = reminder.id
+        if signature == self.signature:
+            return
+        self.signature = signature
+        
+        self.bg_color = bg_color
+        for widget in self.bg_widgets:
+            widget.configure(bg=bg_color)
+        self.frame.configure(highlightbackground=border_color, highlightcolor=border_color)
+        self.name_label.configure(text=reminder.name)
+        self.status_label.configure(text=status_text, fg=status_color)
+        self.dosage_label.configure(text=f"💊 {reminder.dosage}")
+        self.time_label.configure(text=f"🕐 {time_text}")
+        self.repeat_label.configure(text=repeat_text)
+        
+        # Enable/Disable toggle
+        self.toggle_btn.configure(text="Disable" if enabled else "Enable",
+                                  bg='#e74c3c' if enabled else '#27ae60')
+        if not reminder.taken and enabled:
+            self.take_btn.pack(side='left', padx=(0, 5), after=self.toggle_btn)
+            self.snooze_btn.pack(side='left', padx=(0, 5), after=self.take_btn)
+        else:
+            self.take_btn.pack_forget()
+            self.snooze_btn.pack_forget()
+
+class VirtualReminderList:
+    """Scrollable reminder list that only builds cards for the visible rows"""
+    ROW_HEIGHT = 150
+    
+    def __init__(self, parent, app):
+        self.app = app
+        self.rows = []
+        self.width = 1
+        self._cards = {}
+        self._free = []
+        
+        self.canvas = tk.Canvas(parent, bg='white', highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.on_scroll)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        
+        # Empty state
+        self.empty_frame = tk.Frame(self.canvas, bg='white')
+        tk.Label(self.empty_frame, text="📋", font=('Segoe UI', 48), bg='white', fg='#bdc3c7').pack()
+        tk.Label(self.empty_frame, text="No reminders yet", font=('Segoe UI', 16, 'bold'), 
+                bg='white', fg='#7f8c8d').pack(pady=(10, 5))
+        tk.Label(self.empty_frame, text="Click 'Add New Reminder' to get started", 
+                font=('Segoe UI', 12), bg='white', fg='#95a5a6').pack()
+        self.empty_item = self.canvas.create_window(0, 50, window=self.empty_frame, anchor='nw', state='hidden')
+        self.message_item = self.canvas.create_text(20, 50, anchor='nw', font=('Segoe UI', 12), fill='#7f8c8d',
+                                                    state='hidden')
+        
+        self.canvas.bind("<Configure>", self.on_resize)
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+    
+    def show_message(self, text):
+        """Show a status line instead of the list, e.g. while the database loads"""
+        self.canvas.itemconfigure(self.empty_item, state='hidden')
+        self.canvas.itemconfigure(self.message_item, text=text, width=max(self.width - 40, 200), state='normal')
+    
+    def set_reminders(self, reminders):
+        self.canvas.itemconfigure(self.message_item, state='hidden')
+        self.rows = sorted(reminders, key=lambda x: x.time)
+        self.canvas.itemconfigure(self.empty_item, state='normal' if not self.rows else 'hidden')
+        self.canvas.configure(scrollregion=(0, 0, self.width, len(self.rows) * self.ROW_HEIGHT))
+        self.render()
+    
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.render()
+    
+    def on_mousewheel(self, event):
+        self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+    
+    def on_resize(self, event):
+        self.width = event.width
+        self.canvas.itemconfigure(self.empty_item, width=event.width)
+        for card in list(self._cards.values()) + self._free:
+            self.canvas.itemconfigure(card.item, width=event.width - 10)
+        self.canvas.configure(scrollregion=(0, 0, self.width, len(self.rows) * self.ROW_HEIGHT))
+        self.render()
+    
+    def visible_range(self):
+        top = max(0, int(self.canvas.canvasy(0)))
+        height = max(self.canvas.winfo_height(), self.ROW_HEIGHT)
+        first = top // self.ROW_HEIGHT
+        last = min(len(self.rows), (top + height) // self.ROW_HEIGHT + 1)
+        return first, last
+    
+    def render(self):
+        first, last = self.visible_range()
+        # Release cards that scrolled out of view
+        for index in [i for i in self._cards if not first <= i < last]:
+            card = self._cards.pop(index)
+            self.canvas.itemconfigure(card.item, state='hidden')
+            self._free.append(card)
+        
+        now = datetime.now()
+        for index in range(first, last):
+            card = self._cards.get(index)
+            if card is None:
+                card = self._free.pop() if self._free else self._new_card()
+                self._cards[index] = card
+                self.canvas.coords(card.item, 5, index * self.ROW_HEIGHT + 5)
+                self.canvas.itemconfigure(card.item, state='normal')
+            card.bind(self.rows[index], now)
+    
+    def _new_card(self):
+        card = ReminderCard(self)
+        self.canvas.itemconfigure(card.item, width=self.width - 10)
+        return card
+
+class TkBridge:
+    """Hands callbacks from other threads to the Tk thread through a queue drained every ``interval_ms``"""
+    def __init__(self, root, interval_ms=50):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._queue = queue.SimpleQueue()
+        self._job = self.root.after(self.interval_ms, self.drain)
+    
+    def post(self, fn):
+        self._queue.put(fn)
+    
+    def drain(self):
+        while True:
+            try:
+                fn = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                fn()
+            except Exception:
+                log.exception("Error in posted callback")
+        self._job = self.root.after(self.interval_ms, self.drain)
+    
+    def stop(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+class ReminderAlertWindow:
+    """One alert window listing every reminder that fires while it is open"""
+    ROW_HEIGHT = 70
+    MAX_VISIBLE_ROWS = 5
+    BG = '#fff3cd'
+    FG = '#856404'
+    
+    def __init__(self, app):
+        self.app = app
+        self.rows = {}
+        
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Medicine Reminder")
+        self.window.configure(bg=self.BG)
+        self.window.resizable(False, False)
+        self.window.transient(app.root)
+        self.window.grab_set()
+        
+        content_frame = tk.Frame(self.window, bg=self.BG, padx=30, pady=20)
+        content_frame.pack(fill='both', expand=True)
+        
+        tk.Label(content_frame, text="💊", font=('Segoe UI', 36), bg=self.BG).pack()
+        self.title_label = tk.Label(content_frame, font=('Segoe UI', 16, 'bold'), bg=self.BG, fg=self.FG)
+        self.title_label.pack(pady=(0, 15))
+        
+        # Scrollable list of due reminders
+        list_frame = tk.Frame(content_frame, bg=self.BG)
+        list_frame.pack(fill='both', expand=True)
+        self.canvas = tk.Canvas(list_frame, bg=self.BG, highlightthickness=0, width=400, height=self.ROW_HEIGHT)
+        scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+        self.rows_frame = tk.Frame(self.canvas, bg=self.BG)
+        rows_item = self.canvas.create_window(0, 0, window=self.rows_frame, anchor='nw')
+        self.rows_frame.bind('<Configure>',
+                             lambda e: self.canvas.configure(scrollregion=self.canvas.bbox('all')))
+        self.canvas.bind('<Configure>', lambda e: self.canvas.itemconfigure(rows_item, width=e.width))
+        
+        button_frame = tk.Frame(content_frame, bg=self.BG)
+        button_frame.pack(fill='x', pady=(15, 0))
+        tk.Button(button_frame, text="✅ Take All", font=('Segoe UI', 11, 'bold'),
+                  bg='#28a745', fg='white', relief='flat', padx=20, pady=8,
+                  command=self.take_all).pack(side='left')
+        tk.Button(button_frame, text="❌ Dismiss", font=('Segoe UI', 11),
+                  bg='#6c757d', fg='white', relief='flat', padx=20, pady=8,
+                  command=self.window.destroy).pack(side='right')
+        
+        self.window.bind("<Destroy>", self.on_destroy)
+    
+    def add(self, reminders):
+        for reminder in reminders:
+            if reminder.id not in self.rows:
+                self.rows[reminder.id] = self.create_row(reminder)
+        self.layout()
+        self.window.lift()
+    
+    def create_row(self, reminder):
+        row = tk.Frame(self.rows_frame, bg=self.BG, height=self.ROW_HEIGHT)
+        row.pack(fill='x')
+        row.pack_propagate(False)
+        
+        details = tk.Frame(row, bg=self.BG)
+        details.pack(side='left', fill='both', expand=True)
+        tk.Label(details, text=reminder.name, font=('Segoe UI', 12, 'bold'),
+                 bg=self.BG, fg=self.FG, anchor='w').pack(fill='x')
+        tk.Label(details, text=f"{reminder.dosage} · {reminder.time:%H:%M}", font=('Segoe UI', 10),
+                 bg=self.BG, fg=self.FG, anchor='w').pack(fill='x')
+        # Delivery status, filled in as the notification workers finish
+        status_label = tk.Label(details, text="", font=('Segoe UI', 9), bg=self.BG, fg=self.FG, anchor='w')
+        status_label.pack(fill='x')
+        
+        tk.Button(row, text="😴 Snooze", font=('Segoe UI', 10), bg='#ffc107', fg='#212529', relief='flat',
+                  padx=10, command=lambda: self.snooze(reminder.id)).pack(side='right', pady=12)
+        tk.Button(row, text="✅ Take", font=('Segoe UI', 10, 'bold'), bg='#28a745', fg='white', relief='flat',
+                  padx=10, command=lambda: self.take(reminder.id)).pack(side='right', padx=(0, 6), pady=12)
+        
+        delivered = []
+        
+        def on_sent(label, result):
+            if result is None or not status_label.winfo_exists():
+                return
+            delivered.append(f"{label} {'sent' if result else 'failed'}")
+            status_label.config(text=" · ".join(delivered))
+        
+        self.app._delivery_status[reminder.id] = on_sent
+        return row
+    
+    def layout(self):
+        count = len(self.rows)
+        self.title_label.config(text="Time for your medicine!" if count == 1 else f"Time for {count} medicines!")
+        self.canvas.configure(height=self.ROW_HEIGHT * min(count, self.MAX_VISIBLE_ROWS))
+        # Keep the window centred as rows come and go
+        self.window.update_idletasks()
+        width, height = self.window.winfo_reqwidth(), self.window.winfo_reqheight()
+        x = (self.window.winfo_screenwidth() - width) // 2
+        y = (self.window.winfo_screenheight() - height) // 2
+        self.window.geometry(f"{width}x{height}+{x}+{y}")
+    
+    def remove(self, reminder_id):
+        self.rows.pop(reminder_id).destroy()
+        self.app._delivery_status.pop(reminder_id, None)
+        if self.rows:
+            self.layout()
+        else:
+            self.window.destroy()
+    
+    def take(self, reminder_id):
+        self.app.take_reminders([reminder_id])
+        self.remove(reminder_id)
+    
+    def take_all(self):
+        self.app.take_reminders(list(self.rows))
+        self.window.destroy()
+    
+    def snooze(self, reminder_id):
+        snooze_minutes = simpledialog.askinteger("Snooze", "Snooze for how many minutes?", parent=self.window,
+                                                 initialvalue=10, minvalue=1, maxvalue=1440)
+        if snooze_minutes:
+            self.app.snooze_alerted(reminder_id, snooze_minutes)
+            self.remove(reminder_id)
+    
+    def on_destroy(self, event):
+        if event.widget is self.window:
+            for reminder_id in self.rows:
+                self.app._delivery_status.pop(reminder_id, None)
+            self.rows = {}
+            if self.app.alert_window is self:
+                self.app.alert_window = None
+
 class MedicineReminderApp:
-    def __init__(self, root):
+    def __init__(self, root, engine=None):
         self.root = root
         self.root.title("💊 Medicine Reminder")
         self.root.geometry("900x700")
@@ -406,16 +3476,67 @@ class MedicineReminderApp:
         
         self.theme = 'light'
         self.snooze_minutes = 10
-        self.db = ReminderDatabase()
-        self.reminders = self.db.get_reminders()
-        
-        self.create_widgets()
-        self.update_reminders_display()
-        
-        self.running = True
-        self.check_reminders_thread = threading.Thread(target=self.check_reminders, daemon=True)
-        self.check_reminders_thread.start()
+        # Every callback from the loader, engine and change stream threads comes in through here
+        self.bridge = TkBridge(root)
+        # Set by the background loader; the window is up (with its buttons disabled) until then
+        self.engine = None
+        self.db = None
+        self.loaded = False
+        self.reminders = []
+        self.stats = ReminderStats()
+        self._stats_job = None
+        
+        # Alert rows waiting for email/call delivery results, by reminder id
+        self._delivery_status = {}
+        # The open ReminderAlertWindow; reminders firing while it is up join it
+        self.alert_window = None
+        
+        with startup.phase("build window"):
+            self.create_widgets()
+            self.show_status("⏳ Connecting to the database…")
+        threading.Thread(target=self.load_in_background, args=(engine,), daemon=True).start()
+    
+    def show_status(self, text):
+        self.reminder_list.show_message(text)
+        self.stats_label.config(text=text)
+    
+    def load_in_background(self, engine):
+        """Connect, start the engine and read the reminders without blocking the window"""
+        try:
+            if engine is None:
+                with startup.phase("db connect"):
+                    db = open_database(DB_CONFIG)
+                engine = ReminderEngine(db, post=self.bridge.post)
+            engine.on_fired = self.show_reminders
+            engine.on_delivery = self.on_delivery
+            engine.on_change = self.on_external_change
+            # Assigned before start() so callbacks it posts can already reach the engine
+            self.engine = engine
+            self.db = engine.db
+            with startup.phase("engine start"):
+                engine.start()
+            with startup.phase("db load"):
+                reminders = engine.db.get_reminders()
+        except Exception as e:
+            log.exception("Could not open the reminder database")
+            # ``e`` is unbound once the except block ends, so bind the message now
+            status = f"⚠️ Could not open the database: {e}"
+            self.bridge.post(lambda: self.show_status(status))
+            return
+        self.bridge.post(lambda: self.on_loaded(reminders))
+    
+    def on_loaded(self, reminders):
+        self.reminders = reminders
+        self.stats.load(reminders)
+        self.loaded = True
+        for button in (self.add_btn, self.refresh_btn):
+            button.configure(state='normal')
+        with startup.phase("first render"):
+            self.update_reminders_display()
+        startup.mark("ready")
+        startup.report()
         
+        # The tray libraries are only imported once the list is on screen
         if TRAY_ENABLED:
             self.setup_tray_icon()
     
@@ -443,8 +3564,9 @@ class MedicineReminderApp:
         
         refresh_btn = tk.Button(button_frame, text="🔄 Refresh", font=('Segoe UI', 10),
                                bg='#2980b9', fg='white', relief='flat', padx=15, pady=5,
-                               command=self.reload_reminders)
+                               command=self.reload_reminders, state='disabled')
         refresh_btn.pack(side='right', padx=(5, 0))
+        self.refresh_btn = refresh_btn
         
         theme_btn = tk.Button(button_frame, text="🌗 Theme", font=('Segoe UI', 10),
                              bg='#2980b9', fg='white', relief='flat', padx=15, pady=5,
@@ -468,8 +3590,9 @@ class MedicineReminderApp:
         
         add_btn = tk.Button(quick_add_frame, text="+ Add New Reminder", 
                            font=('Segoe UI', 12, 'bold'), bg='#27ae60', fg='white',
-                           relief='flat', padx=20, pady=10, command=self.add_reminder)
+                           relief='flat', padx=20, pady=10, command=self.add_reminder, state='disabled')
         add_btn.pack(fill='x')
+        self.add_btn = add_btn
         
         # Stats section
         stats_frame = tk.Frame(left_panel, bg='white', padx=20, pady=20)
@@ -498,44 +3621,37 @@ class MedicineReminderApp:
         self.reminders_container = tk.Frame(right_panel, bg='white')
         self.reminders_container.pack(fill='both', expand=True, padx=20, pady=20)
         
-        # Scrollable frame for reminders
-        self.canvas = tk.Canvas(self.reminders_container, bg='white', highlightthickness=0)
-        self.scrollbar = ttk.Scrollbar(self.reminders_container, orient="vertical", command=self.canvas.yview)
-        self.scrollable_frame = tk.Frame(self.canvas, bg='white')
-        
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        )
-        
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-        
-        self.canvas.pack(side="left", fill="both", expand=True)
-        self.scrollbar.pack(side="right", fill="y")
-        
-        # Bind mousewheel to canvas
-        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        # Virtualized list: only the rows inside the viewport have widgets
+        self.reminder_list = VirtualReminderList(self.reminders_container, self)
     
-    def _on_mousewheel(self, event):
-        self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+    def run_db(self, fn, *args, on_done=None):
+        """Run a database call on the engine's database thread; ``on_done`` gets its result on the Tk thread"""
+        def done(future):
+            try:
+                result = future.result()
+            except DuplicateReminderError as e:
+                msg = str(e)
+                self.bridge.post(lambda: messagebox.showerror("Duplicate", msg))
+            except Exception as e:
+                log.error("Database call failed", exc_info=e)
+                msg = f"Could not save the change: {e}"
+                self.bridge.post(lambda: messagebox.showerror("Error", msg))
+            else:
+                if on_done:
+                    self.bridge.post(lambda: on_done(result))
+        loop = self.engine.loop
+        loop.submit(loop.run_db(fn, *args)).add_done_callback(done)
     
     def add_reminder(self):
         dialog = ModernReminderDialog(self)
         self.root.wait_window(dialog.dialog)
         
         if dialog.result:
-            # Check for duplicates
-            for rem in self.reminders:
-                if (rem['name'].lower() == dialog.result['name'].lower() and 
-                    rem['time'][-5:] == dialog.result['time'][-5:]):
-                    messagebox.showerror("Duplicate", "A reminder with the same name and time already exists.")
-                    return
-            
-            self.db.add_reminder(dialog.result)
-            self.reminders = self.db.get_reminders()
-            self.update_reminders_display()
-            messagebox.showinfo("Success", "Reminder added successfully!")
+            def added(idx):
+                self.on_reminder_changed(dialog.result.replace(id=idx))
+                self.refresh_from_cache()
+                messagebox.showinfo("Success", "Reminder added successfully!")
+            self.run_db(self.db.add_reminder, dialog.result, on_done=added)
     
     def edit_reminder(self, reminder_id):
         reminder = self.db.get_reminder_by_id(reminder_id)
@@ -546,33 +3662,33 @@ class MedicineReminderApp:
         self.root.wait_window(dialog.dialog)
         
         if dialog.result:
-            self.db.update_reminder(reminder_id, dialog.result)
-            self.reminders = self.db.get_reminders()
-            self.update_reminders_display()
-            messagebox.showinfo("Success", "Reminder updated successfully!")
+            def updated(_):
+                self.on_reminder_changed(dialog.result.replace(id=reminder_id))
+                self.refresh_from_cache()
+                messagebox.showinfo("Success", "Reminder updated successfully!")
+            self.run_db(self.db.update_reminder, reminder_id, dialog.result, on_done=updated)
     
     def delete_reminder(self, reminder_id):
         result = messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this reminder?")
         if result:
-            self.db.delete_reminder(reminder_id)
-            self.reminders = self.db.get_reminders()
-            self.update_reminders_display()
+            def deleted(_):
+                self.on_reminder_removed(reminder_id)
+                self.refresh_from_cache()
+            self.run_db(self.db.delete_reminder, reminder_id, on_done=deleted)
     
     def toggle_reminder(self, reminder_id):
         reminder = self.db.get_reminder_by_id(reminder_id)
         if reminder:
-            reminder['enabled'] = not reminder['enabled']
-            self.db.update_reminder(reminder_id, reminder)
-            self.reminders = self.db.get_reminders()
-            self.update_reminders_display()
+            reminder = reminder.replace(enabled=not reminder.enabled)
+            def toggled(_):
+                self.on_reminder_changed(reminder)
+                self.refresh_from_cache()
+            self.run_db(self.db.update_reminder, reminder_id, reminder, on_done=toggled)
     
     def mark_as_taken(self, reminder_id):
         reminder = self.db.get_reminder_by_id(reminder_id)
         if reminder:
-            reminder['taken'] = True
-            self.db.update_reminder(reminder_id, reminder)
-            self.reminders = self.db.get_reminders()
-            self.update_reminders_display()
+            self.run_db(self.engine.mark_taken, reminder, False, on_done=self.on_stats_changed)
     
     def snooze_reminder(self, reminder_id):
         reminder = self.db.get_reminder_by_id(reminder_id)
@@ -580,168 +3696,17 @@ class MedicineReminderApp:
             snooze_minutes = simpledialog.askinteger("Snooze", "Snooze for how many minutes?", 
                                                     initialvalue=10, minvalue=1, maxvalue=1440)
             if snooze_minutes:
-                t = datetime.strptime(reminder['time'], "%Y-%m-%d %H:%M")
-                t += timedelta(minutes=snooze_minutes)
-                reminder['time'] = t.strftime('%Y-%m-%d %H:%M')
-                reminder['notified'] = False
-                self.db.update_reminder(reminder_id, reminder)
-                self.reminders = self.db.get_reminders()
-                self.update_reminders_display()
-                messagebox.showinfo("Snoozed", f"Reminder snoozed for {snooze_minutes} minutes.")
+                def snoozed(updated):
+                    self.on_stats_changed(updated)
+                    messagebox.showinfo("Snoozed", f"Reminder snoozed for {snooze_minutes} minutes.")
+                self.run_db(self.engine.snooze, reminder, snooze_minutes, on_done=snoozed)
     
     def update_reminders_display(self):
-        # Clear existing widgets
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        
-        if not self.reminders:
-            # Show empty state
-            empty_frame = tk.Frame(self.scrollable_frame, bg='white')
-            empty_frame.pack(fill='x', pady=50)
-            
-            tk.Label(empty_frame, text="📋", font=('Segoe UI', 48), bg='white', fg='#bdc3c7').pack()
-            tk.Label(empty_frame, text="No reminders yet", font=('Segoe UI', 16, 'bold'), 
-                    bg='white', fg='#7f8c8d').pack(pady=(10, 5))
-            tk.Label(empty_frame, text="Click 'Add New Reminder' to get started", 
-                    font=('Segoe UI', 12), bg='white', fg='#95a5a6').pack()
-        else:
-            # Sort reminders by time
-            sorted_reminders = sorted(self.reminders, key=lambda x: x['time'])
-            now = datetime.now()
-            
-            for i, reminder in enumerate(sorted_reminders):
-                self.create_reminder_card(reminder, i, now)
+        self.reminder_list.set_reminders(self.reminders)
         
         # Update stats
         self.update_stats()
     
-    def create_reminder_card(self, reminder, index, now):
-        # Determine card status and colors
-        rem_time = datetime.strptime(reminder['time'], "%Y-%m-%d %H:%M")
-        is_today = rem_time.date() == now.date()
-        is_overdue = rem_time < now and not reminder['taken']
-        is_upcoming = rem_time > now
-        
-        # Color scheme based on status
-        if reminder['taken']:
-            bg_color = '#d5f4e6'
-            border_color = '#27ae60'
-            status_text = "✅ Taken"
-            status_color = '#27ae60'
-        elif is_overdue:
-            bg_color = '#ffeaa7'
-            border_color = '#fdcb6e'
-            status_text = "⚠️ Overdue"
-            status_color = '#e17055'
-        elif is_today and rem_time.hour <= now.hour + 1:
-            bg_color = '#74b9ff'
-            border_color = '#0984e3'
-            status_text = "🔔 Soon"
-            status_color = '#0984e3'
-        else:
-            bg_color = '#f8f9fa'
-            border_color = '#e9ecef'
-            status_text = "📅 Scheduled"
-            status_color = '#6c757d'
-        
-        # Main card frame
-        card_frame = tk.Frame(self.scrollable_frame, bg=bg_color, relief='solid', 
-                             borderwidth=2, bd=2)
-        card_frame.configure(highlightbackground=border_color, highlightcolor=border_color)
-        card_frame.pack(fill='x', pady=5, padx=5)
-        
-        # Card content
-        content_frame = tk.Frame(card_frame, bg=bg_color, padx=15, pady=12)
-        content_frame.pack(fill='x')
-        
-        # Top row - Medicine name and status
-        top_row = tk.Frame(content_frame, bg=bg_color)
-        top_row.pack(fill='x', pady=(0, 8))
-        
-        medicine_name = tk.Label(top_row, text=reminder['name'], 
-                                font=('Segoe UI', 14, 'bold'), bg=bg_color, fg='#2c3e50')
-        medicine_name.pack(side='left', anchor='w')
-        
-        status_label = tk.Label(top_row, text=status_text, font=('Segoe UI', 10, 'bold'),
-                               bg=bg_color, fg=status_color)
-        status_label.pack(side='right', anchor='e')
-        
-        # Middle row - Dosage and time
-        middle_row = tk.Frame(content_frame, bg=bg_color)
-        middle_row.pack(fill='x', pady=(0, 8))
-        
-        dosage_info = tk.Label(middle_row, text=f"💊 {reminder['dosage']}", 
-                              font=('Segoe UI', 11), bg=bg_color, fg='#34495e')
-        dosage_info.pack(side='left', anchor='w')
-        
-        time_str = rem_time.strftime('%I:%M %p')
-        if is_today:
-            time_text = f"Today at {time_str}"
-        elif rem_time.date() == (now + timedelta(days=1)).date():
-            time_text = f"Tomorrow at {time_str}"
-        else:
-            time_text = rem_time.strftime('%b %d at %I:%M %p')
-        
-        time_info = tk.Label(middle_row, text=f"🕐 {time_text}", 
-                            font=('Segoe UI', 11), bg=bg_color, fg='#34495e')
-        time_info.pack(side='right', anchor='e')
-        
-        # Repeat info
-        if reminder['repeat'] != 'Once':
-            repeat_info = tk.Label(content_frame, text=f"🔄 Repeats {reminder['repeat'].lower()}", 
-                                  font=('Segoe UI', 9), bg=bg_color, fg='#7f8c8d')
-            repeat_info.pack(anchor='w', pady=(0, 8))
-        
-        # Action buttons
-        button_frame = tk.Frame(content_frame, bg=bg_color)
-        button_frame.pack(fill='x')
-        
-        # Enable/Disable toggle
-        toggle_text = "Disable" if reminder.get('enabled', True) else "Enable"
-        toggle_color = '#e74c3c' if reminder.get('enabled', True) else '#27ae60'
-        
-        toggle_btn = tk.Button(button_frame, text=toggle_text, font=('Segoe UI', 9),
-                              bg=toggle_color, fg='white', relief='flat', padx=12, pady=4,
-                              command=lambda: self.toggle_reminder(reminder['id']))
-        toggle_btn.pack(side='left', padx=(0, 5))
-        
-        if not reminder['taken'] and reminder.get('enabled', True):
-            # Take button
-            take_btn = tk.Button(button_frame, text="✅ Take", font=('Segoe UI', 9),
-                                bg='#27ae60', fg='white', relief='flat', padx=12, pady=4,
-                                command=lambda: self.mark_as_taken(reminder['id']))
-            take_btn.pack(side='left', padx=(0, 5))
-            
-            # Snooze button
-            snooze_btn = tk.Button(button_frame, text="😴 Snooze", font=('Segoe UI', 9),
-                                  bg='#f39c12', fg='white', relief='flat', padx=12, pady=4,
-                                  command=lambda: self.snooze_reminder(reminder['id']))
-            snooze_btn.pack(side='left', padx=(0, 5))
-        
-        # Edit and Delete buttons
-        edit_btn = tk.Button(button_frame, text="✏️ Edit", font=('Segoe UI', 9),
-                            bg='#3498db', fg='white', relief='flat', padx=12, pady=4,
-                            command=lambda: self.edit_reminder(reminder['id']))
-        edit_btn.pack(side='right', padx=(5, 0))
-        
-        delete_btn = tk.Button(button_frame, text="🗑️ Delete", font=('Segoe UI', 9),
-                              bg='#e74c3c', fg='white', relief='flat', padx=12, pady=4,
-                              command=lambda: self.delete_reminder(reminder['id']))
-        delete_btn.pack(side='right', padx=(5, 0))
-        
-        # Add hover effects
-        self.add_hover_effect(card_frame, bg_color, border_color)
-    
-    def add_hover_effect(self, widget, normal_bg, normal_border):
-        def on_enter(event):
-            widget.configure(bg=self.darken_color(normal_bg))
-        
-        def on_leave(event):
-            widget.configure(bg=normal_bg)
-        
-        widget.bind("<Enter>", on_enter)
-        widget.bind("<Leave>", on_leave)
-    
     def darken_color(self, hex_color):
         # Simple color darkening
         hex_color = hex_color.lstrip('#')
@@ -751,24 +3716,54 @@ class MedicineReminderApp:
     
     def update_stats(self):
         now = datetime.now()
-        today = now.date()
+        stats = self.stats.snapshot(now)
         
-        total_reminders = len(self.reminders)
-        today_reminders = len([r for r in self.reminders if datetime.strptime(r['time'], "%Y-%m-%d %H:%M").date() == today])
-        taken_today = len([r for r in self.reminders if r['taken'] and datetime.strptime(r['time'], "%Y-%m-%d %H:%M").date() == today])
-        overdue = len([r for r in self.reminders if datetime.strptime(r['time'], "%Y-%m-%d %H:%M") < now and not r['taken']])
-        
-        stats_text = f"""📊 Total Reminders: {total_reminders}
-📅 Today's Reminders: {today_reminders}
-✅ Taken Today: {taken_today}
-⚠️ Overdue: {overdue}"""
+        stats_text = f"""📊 Total Reminders: {stats['total']}
+📅 Today's Reminders: {stats['today']}
+✅ Taken Today: {stats['taken_today']}
+⚠️ Overdue: {stats['overdue']}"""
         
         self.stats_label.config(text=stats_text)
+        
+        # Refresh again at midnight or when the next reminder becomes overdue
+        if self._stats_job:
+            self.root.after_cancel(self._stats_job)
+        delay = (self.stats.next_change(now) - now).total_seconds()
+        self._stats_job = self.root.after(max(1000, int(delay * 1000)), self.update_stats)
     
     def reload_reminders(self):
+        def reloaded(_):
+            self.reminders = self.db.get_reminders()
+            self.engine.load(self.reminders)
+            self.stats.load(self.reminders)
+            self.update_reminders_display()
+        self.run_db(self.db.refresh, on_done=reloaded)
+    
+    def on_reminder_changed(self, reminder):
+        self.engine.reminder_changed(reminder)
+        self.stats.update(reminder)
+    
+    def on_reminder_removed(self, reminder_id):
+        self.engine.reminder_removed(reminder_id)
+        self.stats.remove(reminder_id)
+    
+    def on_external_change(self, reminder_id, reminder):
+        # Runs on the change stream thread; the engine has already rescheduled it
+        if reminder is None:
+            self.stats.remove(reminder_id)
+        else:
+            self.stats.update(reminder)
+        self.bridge.post(self.refresh_from_cache)
+    
+    def refresh_from_cache(self):
         self.reminders = self.db.get_reminders()
         self.update_reminders_display()
     
+    def on_stats_changed(self, *reminders):
+        for reminder in reminders:
+            self.stats.update(reminder)
+        self.refresh_from_cache()
+    
     def toggle_theme(self):
         # Simplified theme toggle - you can expand this
         if self.theme == 'light':
@@ -778,128 +3773,38 @@ class MedicineReminderApp:
             self.theme = 'light'
             self.root.configure(bg='#f8f9fa')
     
-    def check_reminders(self):
-        while self.running:
-            now = datetime.now().replace(second=0, microsecond=0)
-            for rem in self.db.get_reminders():
-                if not rem.get('enabled', True):
-                    continue
-                    
-                rem_time = datetime.strptime(rem['time'], "%Y-%m-%d %H:%M")
-                if rem_time <= now and not rem.get('notified', False) and not rem.get('taken', False):
-                    self.show_reminder(rem)
-                    # Update notified status in db
-                    updated_rem = rem.copy()
-                    updated_rem['notified'] = True
-                    self.db.update_reminder(rem['id'], updated_rem)
-            time.sleep(30)
-    
-    def show_reminder(self, reminder):
-        def popup():
-            msg = f"Time to take your medicine:\n\nName: {reminder['name']}\nDosage: {reminder['dosage']}\nTime: {reminder['time'][-5:]}"
-            play_sound()
-            show_tray_notification("Medicine Reminder", msg)
-            send_email("Medicine Reminder", msg)
-            make_call(f"Reminder! It's time to take your medicine {reminder['name']}, dosage {reminder['dosage']}.")
-            
-            # Create custom reminder popup
-            popup_window = tk.Toplevel(self.root)
-            popup_window.title("Medicine Reminder")
-            popup_window.geometry("400x300")
-            popup_window.configure(bg='#fff3cd')
-            popup_window.transient(self.root)
-            popup_window.grab_set()
-            
-            # Center popup
-            popup_window.update_idletasks()
-            x = (popup_window.winfo_screenwidth() // 2) - (400 // 2)
-            y = (popup_window.winfo_screenheight() // 2) - (300 // 2)
-            popup_window.geometry(f"400x300+{x}+{y}")
-            
-            # Popup content
-            content_frame = tk.Frame(popup_window, bg='#fff3cd', padx=30, pady=30)
-            content_frame.pack(fill='both', expand=True)
-            
-            # Icon and title
-            tk.Label(content_frame, text="💊", font=('Segoe UI', 48), bg='#fff3cd').pack(pady=(0, 10))
-            tk.Label(content_frame, text="Time for your medicine!", font=('Segoe UI', 16, 'bold'),
-                    bg='#fff3cd', fg='#856404').pack(pady=(0, 20))
-            
-            # Medicine details
-            details_frame = tk.Frame(content_frame, bg='#fff3cd')
-            details_frame.pack(pady=(0, 20))
-            
-            tk.Label(details_frame, text=f"Medicine: {reminder['name']}", font=('Segoe UI', 12, 'bold'),
-                    bg='#fff3cd', fg='#856404').pack(anchor='w')
-            tk.Label(details_frame, text=f"Dosage: {reminder['dosage']}", font=('Segoe UI', 12),
-                    bg='#fff3cd', fg='#856404').pack(anchor='w')
-            tk.Label(details_frame, text=f"Time: {reminder['time'][-5:]}", font=('Segoe UI', 12),
-                    bg='#fff3cd', fg='#856404').pack(anchor='w')
-            
-            # Action buttons
-            button_frame = tk.Frame(content_frame, bg='#fff3cd')
-            button_frame.pack(fill='x')
-            
-            def mark_taken():
-                updated_rem = reminder.copy()
-                updated_rem['taken'] = True
-                self.handle_recurring_reminder(updated_rem)
-                popup_window.destroy()
-                self.update_reminders_display()
-            
-            def snooze():
-                snooze_minutes = simpledialog.askinteger("Snooze", "Snooze for how many minutes?", 
-                                                        initialvalue=10, minvalue=1, maxvalue=1440)
-                if snooze_minutes:
-                    t = datetime.strptime(reminder['time'], "%Y-%m-%d %H:%M")
-                    updated_rem = reminder.copy()
-                    updated_rem['time'] = (t + timedelta(minutes=snooze_minutes)).strftime('%Y-%m-%d %H:%M')
-                    updated_rem['notified'] = False
-                    self.db.update_reminder(reminder['id'], updated_rem)
-                    popup_window.destroy()
-                    self.update_reminders_display()
-            
-            taken_btn = tk.Button(button_frame, text="✅ Mark as Taken", font=('Segoe UI', 11, 'bold'),
-                                 bg='#28a745', fg='white', relief='flat', padx=20, pady=8,
-                                 command=mark_taken)
-            taken_btn.pack(side='left', padx=(0, 10))
-            
-            snooze_btn = tk.Button(button_frame, text="😴 Snooze", font=('Segoe UI', 11),
-                                  bg='#ffc107', fg='#212529', relief='flat', padx=20, pady=8,
-                                  command=snooze)
-            snooze_btn.pack(side='left')
-            
-            dismiss_btn = tk.Button(button_frame, text="❌ Dismiss", font=('Segoe UI', 11),
-                                   bg='#6c757d', fg='white', relief='flat', padx=20, pady=8,
-                                   command=popup_window.destroy)
-            dismiss_btn.pack(side='right')
-            
-        self.root.after(0, popup)
-    
-    def handle_recurring_reminder(self, reminder):
-        """Handle recurring reminders when marked as taken"""
-        updated_rem = reminder.copy()
-        
-        if reminder['repeat'] == 'Daily':
-            t = datetime.strptime(reminder['time'], "%Y-%m-%d %H:%M") + timedelta(days=1)
-            updated_rem['time'] = t.strftime('%Y-%m-%d %H:%M')
-            updated_rem['notified'] = False
-            updated_rem['taken'] = False
-        elif reminder['repeat'] == 'Weekly':
-            t = datetime.strptime(reminder['time'], "%Y-%m-%d %H:%M") + timedelta(days=7)
-            updated_rem['time'] = t.strftime('%Y-%m-%d %H:%M')
-            updated_rem['notified'] = False
-            updated_rem['taken'] = False
-        elif reminder['repeat'] == 'Custom':
-            interval = reminder.get('interval', 1)
-            t = datetime.strptime(reminder['time'], "%Y-%m-%d %H:%M") + timedelta(days=interval)
-            updated_rem['time'] = t.strftime('%Y-%m-%d %H:%M')
-            updated_rem['notified'] = False
-            updated_rem['taken'] = False
-        
-        self.db.update_reminder(reminder['id'], updated_rem)
+    def show_reminders(self, reminders):
+        # Posted by the engine once per coalesced batch, after it has marked these reminders notified
+        for reminder in reminders:
+            current = self.db.get_reminder_by_id(reminder.id)
+            if current:
+                self.stats.update(current)
+        if self.alert_window is None:
+            self.alert_window = ReminderAlertWindow(self)
+        self.alert_window.add(reminders)
+        self.refresh_from_cache()
+    
+    def take_reminders(self, reminder_ids):
+        # Act on the stored copies; the alert holds the reminders as they were when they fired
+        reminders = [rem for rem in map(self.db.get_reminder_by_id, reminder_ids) if rem]
+        self.run_db(self.engine.mark_all_taken, reminders,
+                    on_done=lambda updated: self.on_stats_changed(*updated))
+    
+    def snooze_alerted(self, reminder_id, minutes):
+        reminder = self.db.get_reminder_by_id(reminder_id)
+        if reminder:
+            self.run_db(self.engine.snooze, reminder, minutes, on_done=self.on_stats_changed)
+    
+    def on_delivery(self, channel, reminders, result):
+        label = "📧 Email" if channel == "email" else "📞 Call"
+        for reminder in reminders:
+            on_sent = self._delivery_status.get(reminder.id)
+            if on_sent:
+                on_sent(label, result)
     
     def setup_tray_icon(self):
+        pystray, Image, ImageDraw = _tray_modules()
+        
         def create_image():
             image = Image.new('RGB', (64, 64), color=(52, 152, 219))
             d = ImageDraw.Draw(image)
@@ -916,19 +3821,145 @@ class MedicineReminderApp:
         
         icon.menu = pystray.Menu(pystray.MenuItem("Show", on_activate))
         
-        def on_closing():
-            self.root.withdraw()
-            icon.run_detached()
-        
-        self.root.protocol("WM_DELETE_WINDOW", on_closing)
+        # The icon is set up after main() registered its close handler; keep closing the app
+        # so the engine is stopped and the database closed
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
     
     def on_closing(self):
-        self.running = False
-        self.db.close()
+        self.bridge.stop()
+        if self.engine:
+            self.engine.stop(timeout=0)
         self.root.destroy()
 
-if __name__ == "__main__":
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra=`` fields"""
+    STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+    
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in self.STANDARD_ATTRS})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(fmt='text', level=logging.INFO):
+    handler = logging.StreamHandler()
+    if fmt == 'json':
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    log.addHandler(handler)
+    log.setLevel(level)
+
+def run_headless():
+    """Run the reminder engine without a window until SIGINT/SIGTERM"""
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.set())
+    
+    with startup.phase("db connect"):
+        db = open_database(DB_CONFIG)
+    engine = ReminderEngine(db, desktop=False, auto_advance=True, partitions=SCHEDULER_CONFIG["partitions"])
+    with startup.phase("engine start"):
+        engine.start()
+    startup.mark("ready")
+    startup.report()
+    # Wake periodically so signals are handled promptly on every platform
+    while not stop.wait(1):
+        pass
+    log.info("Shutdown requested")
+    engine.stop()
+
+def print_adherence_report(db, days, patient_id=ANY_PATIENT):
+    today = date.today()
+    start = today - timedelta(days=days - 1)
+
+    def rate(row):
+        return '-' if row['adherence'] is None else f"{row['adherence']:.0%}"
+
+    print(f"Adherence {start} to {today}")
+    print("\nPer medicine:")
+    for row in db.adherence('medicine', start, today, patient_id):
+        print(f"  {row['name']}\t{rate(row)}\ttaken {row['taken']}, missed {row['missed']}, "
+              f"snoozed {row['snoozed']}, fired {row['fired']}")
+    print("\nPer day:")
+    for row in db.adherence('day', start, today, patient_id):
+        print(f"  {row['day']}\t{rate(row)}\ttaken {row['taken']}, missed {row['missed']}")
+    print("\nStreaks (days with every dose taken):")
+    for row in db.adherence_streaks(today, patient_id):
+        print(f"  {row['name']}\tcurrent {row['current']}, longest {row['longest']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Medicine reminder")
+    parser.add_argument('--headless', action='store_true',
+                        help="run the reminder engine (checking, email, calls, recurrence) without the Tk window")
+    parser.add_argument('--log-format', choices=('text', 'json'), default='text')
+    commands = parser.add_subparsers(dest='command')
+    add_patient = commands.add_parser('add-patient', help="register a patient with their own contacts")
+    add_patient.add_argument('name')
+    add_patient.add_argument('--email')
+    add_patient.add_argument('--phone')
+    commands.add_parser('list-patients', help="print the registered patients")
+    import_cmd = commands.add_parser('import', help="bulk-load reminders from a CSV or JSONL file")
+    import_cmd.add_argument('path')
+    import_cmd.add_argument('--format', choices=('csv', 'jsonl'))
+    import_cmd.add_argument('--chunk-size', type=int, default=500)
+    export_cmd = commands.add_parser('export', help="write every reminder to a CSV or JSONL file")
+    export_cmd.add_argument('path')
+    export_cmd.add_argument('--format', choices=('csv', 'jsonl'))
+    report_cmd = commands.add_parser('report', help="print dose adherence per medicine, per day and streaks")
+    report_cmd.add_argument('--days', type=int, default=30, help="look back this many days (default: %(default)s)")
+    report_cmd.add_argument('--patient', help="only this patient id")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_format)
+    
+    if args.command == 'add-patient':
+        db = open_database(DB_CONFIG)
+        print(db.add_patient({'name': args.name, 'email': args.email, 'phone': args.phone}))
+        db.close()
+        return
+    if args.command == 'list-patients':
+        db = open_database(DB_CONFIG)
+        for patient in db.get_patients():
+            print(f"{patient['id']}\t{patient['name']}\t{patient.get('email') or '-'}\t{patient.get('phone') or '-'}")
+        db.close()
+        return
+    if args.command == 'import':
+        db = open_database(DB_CONFIG)
+        imported, failed = import_reminders(
+            db, args.path, args.format, args.chunk_size,
+            report=lambda line_no, message: print(f"{args.path}:{line_no}: {message}", file=sys.stderr)
+        )
+        db.close()
+        print(f"Imported {imported} reminders, {failed} rows rejected")
+        sys.exit(1 if failed else 0)
+    if args.command == 'export':
+        db = open_database(DB_CONFIG)
+        print(f"Exported {export_reminders(db, args.path, args.format)} reminders")
+        db.close()
+        return
+    if args.command == 'report':
+        db = open_database(DB_CONFIG)
+        print_adherence_report(db, args.days, args.patient or ANY_PATIENT)
+        db.close()
+        return
+    if args.headless:
+        run_headless()
+        return
+    
+    if tk is None:
+        parser.error("tkinter is not available; use --headless")
     root = tk.Tk()
     app = MedicineReminderApp(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+
+startup.mark("import app")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""Benchmarks for the reminder engine, storage backends and reminder list.
+
+Generates synthetic reminder sets against local backends (memory and a
+temporary SQLite file stand in for MongoDB) and prints the timings as JSON so
+results can be compared across commits:
+
+    python benchmark.py --sizes 1000,10000,100000 --output bench.json
+
+Times are in milliseconds unless the key says otherwise. The render
+benchmark needs a display (or Xvfb) and is reported as skipped without one.
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import app
+
+BACKENDS = ('memory', 'sqlite')
+REPEATS = ('Once', 'Daily', 'Weekly', 'Custom')
+INSERT_CHUNK = 10000
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    ms = sorted(s * 1000 for s in samples)
+    if not ms:
+        return None
+    return {
+        "n": len(ms),
+        "mean": round(statistics.fmean(ms), 4),
+        "p50": round(ms[len(ms) // 2], 4),
+        "p95": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        "max": round(ms[-1], 4)
+    }
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def generate(count, now, patients=100, seed=0):
+    """Synthetic reminders: none due yet, roughly a third already dealt with in the past"""
+    rng = random.Random(seed)
+    patient_ids = [f"patient-{i}" for i in range(patients)]
+    for i in range(count):
+        repeat = rng.choice(REPEATS)
+        if rng.random() < 0.3:
+            when = now - timedelta(minutes=rng.randint(1, 3 * 24 * 60))
+            taken, notified = rng.random() < 0.5, True
+        else:
+            when = now + timedelta(minutes=rng.randint(60, 7 * 24 * 60))
+            taken = notified = False
+        yield app.Reminder(
+            name=f"Medicine {i}",
+            dosage=f"{rng.randint(1, 4)} tablets",
+            time=when,
+            repeat=repeat,
+            interval=rng.randint(1, 5) if repeat == 'Custom' else 0,
+            taken=taken,
+            notified=notified,
+            enabled=rng.random() < 0.95,
+            patient_id=rng.choice(patient_ids)
+        )
+
+def open_backend(name, workdir, filename='bench.db'):
+    if name == 'memory':
+        return app.MemoryReminderDatabase()
+    path = os.path.join(workdir, filename)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return app.SQLiteReminderDatabase(path)
+
+def fill(db, reminders):
+    chunk = []
+    for reminder in reminders:
+        chunk.append(reminder)
+        if len(chunk) >= INSERT_CHUNK:
+            db.add_reminders(chunk)
+            chunk = []
+    if chunk:
+        db.add_reminders(chunk)
+
+def quiet_engine(db, partitions=1):
+    """A headless engine whose only channel records deliveries; calls are disabled"""
+    engine = app.ReminderEngine(db, desktop=False, partitions=partitions)
+    engine.notifier = app.NotificationDispatcher({"email": lambda *args: True},
+                                                 workers=app.NOTIFY_CONFIG["workers"],
+                                                 loop=engine.loop)
+    return engine
+
+def bench_db(db, repeat):
+    results = {}
+    samples = timed(db.get_reminders, repeat)
+    results["get_reminders"] = summarize(samples)
+    results["get_reminders_per_s"] = round(len(db.get_reminders()) / statistics.fmean(samples))
+    results["refresh"] = summarize(timed(db.refresh, max(1, repeat // 4)))
+    return results
+
+def bench_tick(db, now, due_count, repeat):
+    """check_reminders with nothing due (the query alone) and with ``due_count`` reminders due"""
+    engine = quiet_engine(db)
+    engine.load(db.get_reminders())
+    results = {"idle": summarize(timed(lambda: engine.check_reminders([]), repeat))}
+    due_ids = [db.add_reminder(app.Reminder(f"Due {i}", "1 tablet", now - timedelta(minutes=1)))
+               for i in range(due_count)]
+    samples = []
+    for _ in range(repeat):
+        for idx in due_ids:
+            db.update_reminder(idx, db.get_reminder_by_id(idx).replace(notified=False))
+        start = time.perf_counter()
+        engine.check_reminders(due_ids)
+        samples.append(time.perf_counter() - start)
+    results[f"due_{due_count}"] = summarize(samples)
+    # The engine was never started, so only its loop's thread pools need shutting down
+    engine.loop.stop()
+    for idx in due_ids:
+        db.delete_reminder(idx)
+    return results
+
+def bench_stats(reminders, now, repeat):
+    stats = app.ReminderStats()
+    results = {"load": summarize(timed(lambda: stats.load(reminders), max(1, repeat // 4)))}
+    results["snapshot"] = summarize(timed(lambda: stats.snapshot(now), repeat))
+    sample = reminders[:repeat] or reminders
+    results["update"] = summarize(timed(lambda: [stats.update(r.replace(taken=True)) for r in sample], 1))
+    results["update"]["per_reminder_ms"] = round(results["update"]["mean"] / max(1, len(sample)), 4)
+    return results
+
+def bench_end_to_end(db, due_count, partitions, timeout=30):
+    """Delay from each reminder's due time to its delivery on the (no-op) email channel.
+
+    Everything falls due on the next whole minute, which SQLite stores exactly, so this waits up to a minute.
+    """
+    engine = quiet_engine(db, partitions)
+    due_at = {}
+    when = (datetime.now() + timedelta(minutes=1, seconds=1)).replace(second=0, microsecond=0)
+    for i in range(due_count):
+        idx = db.add_reminder(app.Reminder(f"E2E {i}", "1 tablet", when, patient_id=f"patient-{i % 10}"))
+        due_at[idx] = when
+    delays = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def on_delivery(channel, reminders, result):
+        delivered = datetime.now()
+        with lock:
+            for rem in reminders:
+                if rem.id in due_at:
+                    delays.append((delivered - due_at.pop(rem.id)).total_seconds())
+            if not due_at:
+                done.set()
+
+    engine.on_delivery = on_delivery
+    engine.start()
+    done.wait((when - datetime.now()).total_seconds() + timeout)
+    engine.stop(close_db=False)
+    result = summarize(delays) or {}
+    result["undelivered"] = len(due_at)
+    return result
+
+def bench_render(db, repeat):
+    if app.tk is None:
+        return {"skipped": "tkinter is not installed"}
+    try:
+        root = app.tk.Tk()
+    except app.tk.TclError as e:
+        return {"skipped": f"no display ({e})"}
+    app.TRAY_ENABLED = False
+    engine = quiet_engine(db)
+    try:
+        gui = app.MedicineReminderApp(root, engine)
+        # The engine starts and the list loads on a background thread
+        deadline = time.monotonic() + 30
+        while not gui.loaded and time.monotonic() < deadline:
+            root.update()
+            time.sleep(0.01)
+
+        def render():
+            gui.update_reminders_display()
+            root.update_idletasks()
+
+        return {"update_reminders_display": summarize(timed(render, repeat))}
+    finally:
+        engine.stop(close_db=False)
+        root.destroy()
+
+def run(backend, size, args, workdir):
+    now = datetime.now()
+    db = open_backend(backend, workdir)
+    start = time.perf_counter()
+    fill(db, generate(size, now, seed=args.seed))
+    elapsed = time.perf_counter() - start
+    result = {"backend": backend, "size": size,
+              "insert": {"total_ms": round(elapsed * 1000, 2), "per_s": round(size / elapsed)}}
+    result["db"] = bench_db(db, args.repeat)
+    result["tick"] = bench_tick(db, now, args.due, args.repeat)
+    result["stats"] = bench_stats(db.get_reminders(), now, args.repeat)
+    if not args.no_render:
+        result["render"] = bench_render(db, args.repeat)
+    db.close()
+    # Starting an engine catches up and prunes, so the end-to-end run gets a copy of the data of its own
+    e2e_db = open_backend(backend, workdir, 'bench-e2e.db')
+    fill(e2e_db, generate(size, now, seed=args.seed))
+    result["end_to_end"] = bench_end_to_end(e2e_db, args.due, args.partitions)
+    e2e_db.close()
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="comma-separated reminder counts (default: %(default)s)")
+    parser.add_argument('--backends', default=','.join(BACKENDS),
+                        help="comma-separated backends (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=20, help="samples per measurement")
+    parser.add_argument('--due', type=int, default=50, help="reminders due per tick")
+    parser.add_argument('--partitions', type=int, default=app.SCHEDULER_CONFIG["partitions"])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-render', action='store_true', help="skip the Tk list benchmark")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # Per-tick "Reminders due" logs would dominate the timings
+    logging.getLogger("medicine_reminder").setLevel(logging.WARNING)
+    app.TWILIO_ENABLED = False
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args)
+        },
+        "results": []
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in args.backends.split(','):
+            for size in (int(s) for s in args.sizes.split(',')):
+                print(f"{backend} x {size}...", file=sys.stderr)
+                report["results"].append(run(backend, size, args, workdir))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """No calls, email or desktop channels, and alerts delivered without the coalescing window"""
+    monkeypatch.setattr(app, "TWILIO_ENABLED", False)
+    monkeypatch.setattr(app, "EMAIL_ENABLED", False)
+    monkeypatch.setitem(app.NOTIFY_CONFIG, "coalesce_ms", 0)
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+
+
+class CountingDatabase(app.MemoryReminderDatabase):
+    def __init__(self):
+        super().__init__()
+        self.lookups = []
+
+    def _load_patients(self):
+        raise AssertionError("get_patient must not scan every patient")
+
+    def _load_patient(self, idx):
+        self.lookups.append(idx)
+        return super()._load_patient(idx)
+
+
+def test_patient_lookup_is_keyed_and_misses_are_cached():
+    db = CountingDatabase()
+    idx = db.add_patient({'name': "Ann", 'email': "ann@example.com", 'phone': None})
+    engine = app.ReminderEngine(db, desktop=False)
+    assert engine.get_patient(idx)['email'] == "ann@example.com"
+    assert engine.get_patient(idx)['name'] == "Ann"
+    assert engine.get_patient("unknown") is None
+    assert engine.get_patient("unknown") is None
+    assert db.lookups == [idx, "unknown"]
+
+
+def test_patient_contacts_are_reread_after_the_ttl():
+    db = app.MemoryReminderDatabase()
+    idx = db.add_patient({'name': "Ann", 'email': "ann@example.com", 'phone': None})
+    engine = app.ReminderEngine(db, desktop=False)
+    assert engine.get_patient(idx)['email'] == "ann@example.com"
+    # Edited by another client, e.g. straight in the patients collection
+    db._patients[idx]['email'] = "ann@example.org"
+    assert engine.get_patient(idx)['email'] == "ann@example.com"
+    engine._patient_expires[idx] = 0  # the TTL has run out
+    assert engine.get_patient(idx)['email'] == "ann@example.org"
+
+
+def test_sqlite_patient_lookup(tmp_path):
+    db = app.SQLiteReminderDatabase(str(tmp_path / "reminders.db"))
+    idx = db.add_patient({'name': "Ann", 'email': None, 'phone': "+100"})
+    assert db.get_patient(idx)['phone'] == "+100"
+    assert db.get_patient("missing") is None
+    db.close()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def db(request, tmp_path):
+    if request.param == "memory":
+        database = app.MemoryReminderDatabase()
+    else:
+        database = app.SQLiteReminderDatabase(str(tmp_path / "reminders.db"))
+    yield database
+    database.close()
+
+
+def reopened(db):
+    """A second connection to the same backend, as another instance would have"""
+    if isinstance(db, app.SQLiteReminderDatabase):
+        return app.SQLiteReminderDatabase(db.conn.execute("PRAGMA database_list").fetchone()['file'])
+    db.refresh()
+    return db
+
+
+NOW = datetime(2026, 10, 16, 8, 0)
+
+
+def test_duplicate_reminders_are_rejected(db):
+    idx = db.add_reminder(app.Reminder("Aspirin", "1 tablet", NOW))
+    with pytest.raises(app.DuplicateReminderError):
+        db.add_reminder(app.Reminder(" aspirin ", "2 tablets", NOW + timedelta(days=1)))
+    # The key is fixed at creation, so snoozing never collides
+    snoozed = db.get_reminder_by_id(idx).replace(time=NOW + timedelta(minutes=10))
+    db.update_reminder(idx, snoozed)
+    db.add_reminder(app.Reminder("Aspirin", "1 tablet", NOW + timedelta(minutes=10)))
+
+
+def test_claim_leases_due_reminders_once(db):
+    due = db.add_reminder(app.Reminder("Aspirin", "1 tablet", NOW - timedelta(minutes=1)))
+    db.add_reminder(app.Reminder("Ibuprofen", "1 tablet", NOW + timedelta(hours=1)))
+    claimed, held_until = db.claim_due(NOW, "a", timedelta(minutes=5))
+    assert [rem.id for rem in claimed] == [due]
+    assert held_until is None
+    other = reopened(db)
+    claimed, held_until = other.claim_due(NOW, "b", timedelta(minutes=5))
+    assert claimed == []
+    assert held_until == NOW + timedelta(minutes=5)
+    # Owner "a" died; once its lease runs out the reminder is claimable again
+    claimed, _ = other.claim_due(NOW + timedelta(minutes=6), "b", timedelta(minutes=5))
+    assert [rem.id for rem in claimed] == [due]
+
+
+def test_released_claim_is_not_claimed_again(db):
+    idx = db.add_reminder(app.Reminder("Aspirin", "1 tablet", NOW - timedelta(minutes=1)))
+    (claimed,), _ = db.claim_due(NOW, "a", timedelta(minutes=5))
+    with db.batch(release=True) as batch:
+        batch.update(claimed.replace(notified=True))
+    assert db.claim_due(NOW + timedelta(minutes=10), "b", timedelta(minutes=5)) == ([], None)
+    assert db.get_reminder_by_id(idx).notified
+
+
+def test_write_batch_collapses_updates_and_records_events(db):
+    idx = db.add_reminder(app.Reminder("Aspirin", "1 tablet", NOW))
+    reminder = db.get_reminder_by_id(idx)
+    with db.batch() as batch:
+        batch.update(reminder.replace(notified=True))
+        batch.update(reminder.replace(notified=True, taken=True))
+        batch.add_events([app.dose_event(reminder, 'fired', NOW), app.dose_event(reminder, 'taken', NOW)])
+        assert len(batch) == 1
+    stored = reopened(db).get_reminder_by_id(idx)
+    assert stored.notified and stored.taken
+    (row,) = db.adherence()
+    assert (row['fired'], row['taken'], row['adherence']) == (1, 1, 1.0)
+
+
+def test_catch_up_skips_missed_occurrences(db, monkeypatch):
+    monkeypatch.setitem(app.SCHEDULER_CONFIG, "catch_up_grace", 30)
+    now = datetime.now().replace(second=0, microsecond=0)
+    start = now - timedelta(days=3, hours=1)
+    idx = db.add_reminder(app.Reminder("Aspirin", "1 tablet", start, repeat='Daily'))
+    engine = app.ReminderEngine(db, desktop=False)
+    assert engine.catch_up(now) == 1
+    assert db.get_reminder_by_id(idx).time == start + timedelta(days=4)
+    (row,) = db.adherence()
+    assert row['missed'] == 4
+
+
+def test_catch_up_leaves_a_finished_series_alone(db):
+    now = datetime.now().replace(second=0, microsecond=0)
+    start = now - timedelta(days=5)
+    db.add_reminder(app.Reminder("Aspirin", "1 tablet", start, repeat='Rule', rule="FREQ=DAILY;COUNT=2"))
+    engine = app.ReminderEngine(db, desktop=False)
+    assert engine.catch_up(now) == 1
+    assert engine.catch_up(now) == 0
+    (row,) = db.adherence()
+    assert row['missed'] == 2
+
+
+def test_sqlite_anchors_stored_rules_without_dtstart(tmp_path):
+    path = str(tmp_path / "reminders.db")
+    db = app.SQLiteReminderDatabase(path)
+    idx = db.add_reminder(app.Reminder("Aspirin", "1 tablet", NOW, repeat='Rule', rule="FREQ=DAILY;COUNT=2"))
+    with db.conn:
+        db.conn.execute("UPDATE reminders SET rule = 'FREQ=DAILY;COUNT=2' WHERE id = ?", (idx,))
+    db.close()
+    db = app.SQLiteReminderDatabase(path)
+    assert db.conn.execute("SELECT rule FROM reminders WHERE id = ?", (idx,)).fetchone()['rule'] == \
+        "DTSTART=20261016T080000;FREQ=DAILY;COUNT=2"
+    db.close()
@@ -0,0 +1,35 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import app
+
+
+def test_import_reports_bad_patient_ids_per_row(tmp_path):
+    path = tmp_path / "reminders.jsonl"
+    rows = [
+        {"name": "Aspirin", "dosage": "1 tablet", "time": "08:00", "patient_id": 5},
+        {"name": "Vitamin D", "dosage": "1 drop", "time": "09:00", "patient_id": ["p1"]},
+        {"name": "Iron", "dosage": "1 tablet", "time": "10:00"},
+    ]
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    db = app.MemoryReminderDatabase()
+    errors = []
+    imported, failed = app.import_reminders(db, str(path), chunk_size=1,
+                                            report=lambda line_no, message: errors.append(line_no))
+    assert (imported, failed) == (2, 1)
+    assert errors == [2]
+    assert sorted(str(r.patient_id) for r in db.get_reminders()) == ["5", "None"]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_export_round_trip_keeps_extra_fields(tmp_path, fmt):
+    source = app.MemoryReminderDatabase()
+    source.add_reminder(app.Reminder("Aspirin", "1 tablet", datetime(2026, 10, 16, 8, 0), extra={'sound': "a.wav"}))
+    source.add_reminder(app.Reminder("Iron", "1 tablet", datetime(2026, 10, 16, 9, 0)))
+    path = str(tmp_path / f"reminders.{fmt}")
+    assert app.export_reminders(source, path) == 2
+    target = app.MemoryReminderDatabase()
+    assert app.import_reminders(target, path) == (2, 0)
+    assert {r.name: r.extra for r in target.get_reminders()} == {"Aspirin": {'sound': "a.wav"}, "Iron": {}}
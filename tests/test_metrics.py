@@ -0,0 +1,12 @@
+import app
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = app.Histogram()
+    for seconds in (0.004, 0.02, 0.02, 400):
+        histogram.observe(seconds)
+    snapshot = histogram.to_dict()
+    buckets = snapshot["buckets"]
+    assert (buckets["le_0.005"], buckets["le_0.01"], buckets["le_0.025"], buckets["le_300"]) == (1, 1, 3, 3)
+    assert buckets["le_+Inf"] == snapshot["count"] == 4
+    assert snapshot["sum"] == 400.044
@@ -0,0 +1,218 @@
+import smtplib
+import threading
+import time
+
+import pytest
+
+import app
+
+
+class FakeSMTP:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+        self.closed = False
+
+    def send_message(self, msg):
+        if self.error:
+            raise self.error
+        self.sent.append(msg)
+
+    def close(self):
+        self.closed = True
+
+
+def pool_with(*servers):
+    pool = app.SMTPSessionPool({}, size=1)
+    connections = iter(servers)
+    pool._connect = lambda: next(connections)
+    return pool
+
+
+def test_dropped_connection_is_resent_once():
+    stale, fresh = FakeSMTP(smtplib.SMTPServerDisconnected()), FakeSMTP()
+    pool_with(stale, fresh).send("msg")
+    assert stale.closed
+    assert fresh.sent == ["msg"]
+
+
+def test_refused_recipients_are_not_resent():
+    refused = FakeSMTP(smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"no such user")}))
+    pool = pool_with(refused, FakeSMTP())
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send("msg")
+    assert refused.closed
+    assert pool._idle.empty()
+
+
+def test_failed_resend_closes_the_fresh_connection():
+    fresh = FakeSMTP(ConnectionResetError())
+    with pytest.raises(ConnectionResetError):
+        pool_with(FakeSMTP(ConnectionResetError()), fresh).send("msg")
+    assert fresh.closed
+
+
+def test_call_queue_outlives_a_stopped_engine(monkeypatch):
+    monkeypatch.setattr(app, "TWILIO_ENABLED", True)
+    monkeypatch.setattr(app, "_twilio_client", app.FakeTwilioClient())
+    app.ReminderEngine(app.MemoryReminderDatabase(), desktop=False).stop(timeout=0)
+    placed = threading.Event()
+    app.make_call(["Aspirin, dosage 1 tablet"], callback=lambda ok: placed.set(), to_number="+15550100")
+    try:
+        assert placed.wait(5)
+    finally:
+        app.stop_call_queue()
+
+
+def test_burst_larger_than_the_pool_is_delivered_in_full():
+    lock = threading.Lock()
+    active, peak, sent = [0], [0], []
+
+    def email(i):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.001)
+        with lock:
+            active[0] -= 1
+            sent.append(i)
+        return True
+
+    results = []
+    dispatcher = app.NotificationDispatcher({"email": email}, workers=4, channel_limits={"email": 2})
+    for i in range(250):
+        dispatcher.submit("email", i, callback=results.append)
+    dispatcher.stop(timeout=10)
+    assert sorted(sent) == list(range(250))
+    assert results == [True] * 250
+    assert peak[0] <= 2
+
+
+class FlakyCalls:
+    """Twilio client stand-in that raises the queued errors before placing a call"""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.attempts = []
+        self.placed = []
+        self.calls = self
+
+    def create(self, to, from_, twiml):
+        self.attempts.append((time.monotonic(), to))
+        if self.errors:
+            raise self.errors.pop(0)
+        self.placed.append((to, twiml))
+        return app.SimpleNamespace(sid=f"CA{len(self.placed)}")
+
+
+def call_queue(client, **kwargs):
+    return app.CallQueue(lambda: client, "+15550000", **kwargs)
+
+
+def test_calls_per_minute_cap_holds_back_extra_calls():
+    client = FlakyCalls()
+    queue = call_queue(client, calls_per_minute=2)
+    try:
+        for number in ("+15550001", "+15550002", "+15550003"):
+            queue.submit(number, ["Aspirin, dosage 1 tablet"])
+        time.sleep(0.3)
+        assert [to for to, _ in client.placed] == ["+15550001", "+15550002"]
+        assert list(queue._pending) == ["+15550003"]
+    finally:
+        queue.stop()
+
+
+def test_messages_for_one_number_are_merged_into_one_call():
+    client = FlakyCalls()
+    results = []
+    queue = call_queue(client)
+    try:
+        # Holding the condition keeps the worker from taking the first message on its own
+        with queue._cond:
+            queue.submit("+15550001", ["Aspirin, dosage 1 tablet"], callback=results.append)
+            queue.submit("+15550001", ["Iron, dosage 2 tablets"], callback=results.append)
+        deadline = time.monotonic() + 5
+        while len(results) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        queue.stop()
+    ((to, twiml),) = client.placed
+    assert "Aspirin" in twiml and "Iron" in twiml
+    assert results == [True, True]
+
+
+def test_transient_errors_are_retried_with_backoff():
+    client = FlakyCalls(OSError("connection reset"), OSError("connection reset"))
+    placed = threading.Event()
+    queue = call_queue(client, backoff=0.05)
+    try:
+        queue.submit("+15550001", ["Aspirin, dosage 1 tablet"], callback=lambda ok: ok and placed.set())
+        assert placed.wait(5)
+    finally:
+        queue.stop()
+    times = [t for t, _ in client.attempts]
+    assert len(times) == 3
+    # Backoff doubles: 0.05 s, then 0.1 s
+    assert times[1] - times[0] >= 0.05 and times[2] - times[1] >= 0.1
+
+
+def test_other_errors_are_not_retried():
+    client = FlakyCalls(ValueError("invalid number"))
+    results = []
+    queue = call_queue(client, backoff=0.05)
+    try:
+        queue.submit("+15550001", ["Aspirin, dosage 1 tablet"], callback=results.append)
+        deadline = time.monotonic() + 5
+        while not results and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        queue.stop()
+    assert results == [False]
+    assert len(client.attempts) == 1
+
+
+def coalescer(window):
+    loop = app.EngineLoop().start()
+    batches = []
+    delivered = threading.Event()
+
+    def deliver(batch):
+        batches.append(batch)
+        delivered.set()
+
+    return app.AlertCoalescer(window, deliver, loop), batches, delivered
+
+
+def test_reminders_fired_within_the_window_are_alerted_together():
+    alerts, batches, delivered = coalescer(0.2)
+    try:
+        alerts.add(["a"])
+        alerts.add(["b", "c"])
+        assert delivered.wait(5)
+        delivered.clear()
+        # A reminder after the window has closed starts a batch of its own
+        alerts.add(["d"])
+        assert delivered.wait(5)
+    finally:
+        alerts.loop.stop()
+    assert batches == [["a", "b", "c"], ["d"]]
+
+
+def test_zero_window_delivers_each_batch_on_its_own():
+    alerts, batches, _ = coalescer(0)
+    try:
+        alerts.add(["a"])
+        alerts.add(["b"])
+        alerts.loop.call(lambda: None, timeout=5)
+    finally:
+        alerts.loop.stop()
+    assert batches == [["a"], ["b"]]
+
+
+def test_flush_delivers_a_pending_batch_before_the_window_ends():
+    alerts, batches, _ = coalescer(60)
+    try:
+        alerts.add(["a"])
+        alerts.loop.call(alerts.flush, timeout=5)
+    finally:
+        alerts.loop.stop()
+    assert batches == [["a"]]
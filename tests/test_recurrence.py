@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+
+START = datetime(2026, 10, 16, 8, 0)  # a Friday
+
+
+def test_rule_round_trips_through_text():
+    rule = app.Recurrence.parse("DTSTART:20261016T080000\nRRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR;COUNT=5")
+    assert str(rule) == "DTSTART=20261016T080000;FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR;COUNT=5"
+    assert str(app.Recurrence.parse(str(rule))) == str(rule)
+
+
+@pytest.mark.parametrize("text", ["", "FREQ=YEARLY", "FREQ=DAILY;INTERVAL=0", "FREQ=WEEKLY;BYDAY=1MO",
+                                  "FREQ=DAILY;BYSETPOS=1"])
+def test_unsupported_rules_are_rejected(text):
+    with pytest.raises(ValueError):
+        app.Recurrence.parse(text)
+
+
+def test_weekly_byday_with_interval():
+    rule = app.Recurrence.parse("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR")
+    assert list(rule.between(START, START - timedelta(minutes=1), START + timedelta(days=15))) == [
+        START, START + timedelta(days=10), START + timedelta(days=14)]
+
+
+def test_next_after_jumps_to_the_right_period():
+    rule = app.Recurrence.parse("FREQ=DAILY;INTERVAL=3")
+    assert rule.next_after(START, START + timedelta(days=300)) == START + timedelta(days=303)
+
+
+def test_count_counts_from_dtstart():
+    rule = app.Recurrence.parse("DTSTART=20261016T080000;FREQ=DAILY;COUNT=3")
+    assert rule.next_after(START, START + timedelta(days=1)) == START + timedelta(days=2)
+    assert rule.next_after(START, START + timedelta(days=2)) is None
+
+
+def test_reminder_anchors_a_rule_without_dtstart():
+    reminder = app.Reminder("Aspirin", "1 tablet", START, repeat='Rule', rule="FREQ=DAILY;COUNT=2")
+    assert reminder.rule == "DTSTART=20261016T080000;FREQ=DAILY;COUNT=2"
+    second = app.ReminderEngine.next_occurrence(reminder)
+    assert second.time == START + timedelta(days=1)
+    # The series is over; advancing again must not restart it from the new time
+    assert app.ReminderEngine.next_occurrence(second) is second
+
+
+def test_interval_does_not_drift_across_advances():
+    reminder = app.Reminder("Aspirin", "1 tablet", START, repeat='Rule', rule="FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR")
+    times = []
+    for _ in range(4):
+        reminder = app.ReminderEngine.next_occurrence(reminder)
+        times.append(reminder.time)
+    assert [t - START for t in times] == [timedelta(days=d) for d in (10, 14, 24, 28)]
+
+
+def test_auto_advance_leaves_a_finished_series_notified():
+    db = app.MemoryReminderDatabase()
+    fire_at = datetime.now().replace(second=0, microsecond=0) - timedelta(minutes=1)
+    idx = db.add_reminder(app.Reminder("Aspirin", "1 tablet", fire_at, repeat='Rule', rule="FREQ=DAILY;COUNT=1"))
+    engine = app.ReminderEngine(db, desktop=False, auto_advance=True)
+    engine._check_due(0)
+    assert db.get_reminder_by_id(idx).notified
+    # Released and still notified, so nothing is left to claim
+    assert db.claim_due(datetime.now(), "other", timedelta(minutes=5)) == ([], None)
@@ -0,0 +1,77 @@
+import threading
+from datetime import datetime, timedelta
+
+import app
+
+
+class FlakyDatabase(app.MemoryReminderDatabase):
+    """Fails the first claim, as a dropped database connection would"""
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    def _claim_due(self, now, token, until, partition):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unreachable")
+        return super()._claim_due(now, token, until, partition)
+
+
+def test_failed_tick_is_retried(monkeypatch):
+    monkeypatch.setattr(app.ReminderScheduler, "RETRY_DELAY", timedelta(milliseconds=200))
+    db = FlakyDatabase()
+    idx = db.add_reminder(app.Reminder("Aspirin", "1 tablet", datetime.now() + timedelta(milliseconds=100)))
+    fired = threading.Event()
+    engine = app.ReminderEngine(db, desktop=False)
+    engine.on_fired = lambda due: fired.set()
+    engine.start()
+    try:
+        assert fired.wait(5)
+    finally:
+        engine.stop()
+    assert db.failures == 0
+    assert db.get_reminder_by_id(idx).notified
+
+
+class RecordingDatabase(app.MemoryReminderDatabase):
+    """Records which threads looked up patients"""
+    def __init__(self):
+        super().__init__()
+        self.lookup_threads = []
+
+    def _load_patient(self, idx):
+        self.lookup_threads.append(threading.current_thread().name)
+        return super()._load_patient(idx)
+
+
+def test_patient_lookup_stays_off_the_loop_thread():
+    db = RecordingDatabase()
+    db.add_reminder(app.Reminder("Aspirin", "1 tablet", datetime.now() + timedelta(milliseconds=100),
+                                 patient_id="unknown"))
+    fired = threading.Event()
+    engine = app.ReminderEngine(db, desktop=False, partitions=3)
+    engine.on_fired = lambda due: fired.set()
+    engine.start()
+    try:
+        assert fired.wait(5)
+    finally:
+        engine.stop()
+    assert engine.loop.db_executor._max_workers == 3
+    assert db.lookup_threads
+    assert all(name.startswith("reminder-db") for name in db.lookup_threads)
+
+
+def test_reminders_added_by_another_instance_are_claimed(monkeypatch):
+    monkeypatch.setitem(app.SCHEDULER_CONFIG, "sweep_seconds", 0.2)
+    db = app.MemoryReminderDatabase()
+    fired = threading.Event()
+    engine = app.ReminderEngine(db, desktop=False)
+    engine.on_fired = lambda due: fired.set()
+    engine.start()
+    try:
+        # Written straight to the store, so this engine's heap never hears of it
+        idx = db.add_reminder(app.Reminder("Aspirin", "1 tablet", datetime.now()))
+        assert fired.wait(5)
+    finally:
+        engine.stop()
+    assert db.get_reminder_by_id(idx).notified
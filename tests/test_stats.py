@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+import app
+
+EVENING = datetime(2026, 10, 16, 22, 0)
+
+
+def reminder(idx, when, taken=False):
+    return app.Reminder(f"Medicine {idx}", "1 tablet", when, taken=taken, id=idx)
+
+
+def loaded(*reminders):
+    stats = app.ReminderStats()
+    stats.load(reminders)
+    return stats
+
+
+def test_counts_roll_over_at_midnight():
+    late, early = EVENING.replace(hour=23), EVENING + timedelta(hours=3)  # 23:00 today, 01:00 tomorrow
+    stats = loaded(reminder("a", late), reminder("b", early), reminder("c", EVENING - timedelta(hours=2), taken=True))
+    assert stats.snapshot(EVENING) == {'total': 3, 'today': 2, 'taken_today': 1, 'overdue': 0}
+    after_midnight = EVENING + timedelta(hours=2, minutes=30)
+    assert stats.snapshot(after_midnight) == {'total': 3, 'today': 1, 'taken_today': 0, 'overdue': 1}
+
+
+def test_next_change_is_the_next_overdue_reminder_or_midnight():
+    late = EVENING.replace(hour=23)
+    stats = loaded(reminder("a", late))
+    assert stats.next_change(EVENING) == late + timedelta(seconds=1)
+    midnight = datetime(2026, 10, 17)
+    assert stats.next_change(late + timedelta(minutes=5)) == midnight
+
+
+def test_updates_move_reminders_between_counts():
+    stats = loaded(reminder("a", EVENING - timedelta(hours=1)), reminder("b", EVENING + timedelta(hours=1)))
+    assert stats.snapshot(EVENING)['overdue'] == 1
+    stats.update(reminder("a", EVENING - timedelta(hours=1), taken=True))
+    assert stats.snapshot(EVENING) == {'total': 2, 'today': 2, 'taken_today': 1, 'overdue': 0}
+    # Snoozed past midnight: no longer today
+    stats.update(reminder("b", EVENING + timedelta(hours=3)))
+    stats.remove("a")
+    assert stats.snapshot(EVENING) == {'total': 1, 'today': 0, 'taken_today': 0, 'overdue': 0}